@@ -0,0 +1,66 @@
+"""Industry breadth per trading day, computed with grouped reductions over wide panels"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+BREADTH_COLUMNS = ["industry", "members", "kd_low", "kd_low_share", "median_k", "median_d",
+                   "vol_spikes", "advances", "declines", "ad_ratio"]
+
+
+def industry_breadth(panel: Dict[str, pd.DataFrame], industries: pd.Series, kd_limit: float,
+                     spike_ratio: float, days: int) -> pd.DataFrame:
+    """Aggregate the last `days` bars of a {field: date x ticker} panel by industry.
+
+    panel needs Close, K, D and vol_ratio; industries maps ticker -> industry name.
+    Returns one row per (date, industry), date as index.
+    """
+    close = panel["Close"]
+    tickers = close.columns
+    # 產業轉為類別代碼，所有彙總都以代碼分組，不逐檔迴圈
+    category = pd.Categorical(industries.reindex(tickers).fillna("Unknown"))
+    codes = category.codes
+    n_groups = len(category.categories)
+    # one-hot (ticker x industry)，計數類彙總以矩陣乘法一次完成
+    membership = np.zeros((len(tickers), n_groups))
+    membership[np.arange(len(tickers)), codes] = 1.0
+
+    def grouped_sum(mask: pd.DataFrame) -> np.ndarray:
+        return mask.to_numpy(dtype=float) @ membership
+
+    k, d = panel["K"], panel["D"]
+    change = close.diff()
+    counts = {
+        "members": grouped_sum(close.notna()),
+        "kd_low": grouped_sum((k <= kd_limit) & (d <= kd_limit)),
+        "vol_spikes": grouped_sum(panel["vol_ratio"] >= spike_ratio),
+        "advances": grouped_sum(change > 0),
+        "declines": grouped_sum(change < 0),
+    }
+    # 中位數無法以加總求得，改用轉置後依代碼分組
+    median_k = k.T.groupby(codes).median().T.reindex(columns=range(n_groups)).to_numpy()
+    median_d = d.T.groupby(codes).median().T.reindex(columns=range(n_groups)).to_numpy()
+
+    n_dates = len(close.index)
+    members = counts["members"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kd_low_share = np.where(members > 0, counts["kd_low"] / members, np.nan)
+        ad_ratio = np.where(counts["declines"] > 0, counts["advances"] / counts["declines"], np.nan)
+
+    result = pd.DataFrame({
+        "industry": np.tile(np.asarray(category.categories, dtype=object), n_dates),
+        "members": members.ravel().astype(int),
+        "kd_low": counts["kd_low"].ravel().astype(int),
+        "kd_low_share": kd_low_share.ravel(),
+        "median_k": median_k.ravel(),
+        "median_d": median_d.ravel(),
+        "vol_spikes": counts["vol_spikes"].ravel().astype(int),
+        "advances": counts["advances"].ravel().astype(int),
+        "declines": counts["declines"].ravel().astype(int),
+        "ad_ratio": ad_ratio.ravel(),
+    }, index=np.repeat(close.index, n_groups))
+    result.index.name = "Date"
+    # 第一根沒有前一日收盤可比較，只保留最近 days 根
+    keep_dates = close.index[-days:]
+    result = result[result.index.isin(keep_dates) & (result["members"] > 0)]
+    return result[BREADTH_COLUMNS]
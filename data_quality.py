@@ -0,0 +1,69 @@
+"""Vectorized data-quality checks over a whole download batch, run before any indicator work"""
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 檢查項目，依序判定；一支股票只記錄第一個不合格原因
+REASONS = ("all_nan", "insufficient_bars", "stale", "zero_volume")
+
+
+def validate_panel(panel: Dict[str, pd.DataFrame], min_bars: int,
+                   drop_reasons: Iterable[str] = REASONS,
+                   last_session: Optional[datetime.date] = None,
+                   log=None) -> Tuple[List[str], pd.Series, Dict[str, int]]:
+    """Check every ticker of a {field: date x ticker} panel at once.
+
+    A ticker is stale when its last valid bar is older than `last_session`, the latest
+    trading session from the calendar. Without it, or when no ticker in the panel has a
+    bar on that session yet (data not posted, closure missing from the holiday file),
+    the newest valid date in the panel is used instead.
+    Returns (tickers to keep, first failing reason per flagged ticker, counts per reason).
+    Flagged tickers whose reason is not in `drop_reasons` are kept but still reported.
+    """
+    close = panel["Close"]
+    volume = panel["Volume"]
+    tickers = close.columns
+    valid = close.notna().to_numpy()
+    n_rows = valid.shape[0]
+
+    valid_counts = valid.sum(axis=0)
+    has_data = valid_counts > 0
+    # 每支股票最後一筆有效資料的位置
+    last_pos = np.where(has_data, n_rows - 1 - valid[::-1].argmax(axis=0), -1)
+    last_volume = volume.to_numpy()[np.clip(last_pos, 0, None), np.arange(len(tickers))]
+
+    dates = pd.DatetimeIndex(pd.to_datetime(close.index))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    dates = dates.normalize()
+    last_date = dates[np.clip(last_pos, 0, None)]
+    newest = last_date[has_data].max() if has_data.any() else dates.max()
+    expected = newest
+    if last_session is not None:
+        expected = pd.Timestamp(last_session)
+        if has_data.any() and newest < expected:
+            # 整批都沒有最近交易日的K棒，多半是資料尚未更新或休市日未登錄，不應整批剔除
+            if log:
+                log.warning("No ticker has a bar for %s (newest is %s), judging staleness against %s",
+                            expected.date(), newest.date(), newest.date())
+            expected = newest
+
+    checks = {
+        "all_nan": ~has_data,
+        "insufficient_bars": valid_counts < min_bars,
+        # 最後一筆早於最近交易日，代表這支沒有更新
+        "stale": has_data & (last_date < expected),
+        "zero_volume": ~(last_volume > 0),
+    }
+
+    reason = pd.Series(None, index=tickers, dtype=object)
+    for name in REASONS:
+        reason[checks[name] & reason.isna().to_numpy()] = name
+    flagged = reason.dropna()
+
+    drop = set(flagged[flagged.isin(list(drop_reasons))].index)
+    keep = [ticker for ticker in tickers if ticker not in drop]
+    counts = {name: int((flagged == name).sum()) for name in REASONS}
+    return keep, flagged, counts
@@ -10,13 +10,16 @@ import logger
 
 
 
-def send_mail(log=None, config_file: str = 'gmail_config.yaml', attaches=None) -> bool:
+def send_mail(log=None, config_file: str = 'gmail_config.yaml', attaches=None,
+              subject_prefix: str = "", note: str = "") -> bool:
     """Send email with optional attachments.
     
     Args:
         log: Logger instance (creates one if None)
         config_file: Path to Gmail config YAML file
         attaches: List of file paths to attach
+        subject_prefix: Text put in front of the configured subject
+        note: Text put in front of the configured body
         
     Returns:
         bool: True if email sent successfully
@@ -39,10 +42,11 @@ def send_mail(log=None, config_file: str = 'gmail_config.yaml', attaches=None) -
     msg = MIMEMultipart()
     msg['From'] = email_config['sender_email']
     msg['To'] = ', '.join(email_config['receiver_emails'])
-    msg['Subject'] = email_config['subject']
+    msg['Subject'] = f"{subject_prefix} {email_config['subject']}" if subject_prefix else email_config['subject']
 
     # 電子郵件正文
-    msg.attach(MIMEText(email_config['body'], 'plain'))
+    body = f"{note}\n\n{email_config['body']}" if note else email_config['body']
+    msg.attach(MIMEText(body, 'plain'))
 
     # 附件文件的路徑
     if attaches:
@@ -0,0 +1,190 @@
+"""Technical indicator registry and fused planner.
+
+Every indicator declares the shared intermediates (rolling windows, EMAs,
+differences) it depends on. ``IndicatorPlan`` computes each distinct
+intermediate once per price panel and feeds it to all requested indicators,
+so adding an indicator does not add another full pass over the data.
+
+Fields may be per-ticker Series or wide DataFrames (date x ticker); pandas
+applies the same column-wise operations to both.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import kd_tools as kd
+
+# (operation, source field, window)
+Spec = Tuple[str, str, int]
+
+
+@dataclass(frozen=True)
+class Indicator:
+    """A registered indicator"""
+    name: str
+    columns: Callable[[Dict], Tuple[str, ...]]
+    requires: Callable[[Dict], List[Spec]]
+    compute: Callable[[Dict, Dict, Dict], Dict]
+    warmup: Callable[[Dict], int]
+    defaults: Dict = field(default_factory=dict)
+
+
+REGISTRY: Dict[str, Indicator] = {}
+
+
+def register(indicator: Indicator) -> Indicator:
+    """Register (or replace) an indicator by name"""
+    REGISTRY[indicator.name] = indicator
+    return indicator
+
+
+def _compute_intermediate(spec: Spec, fields: Dict):
+    """Compute one shared intermediate from the raw price fields"""
+    op, source, window = spec
+    series = fields[source]
+    if op == "rolling_min":
+        return series.rolling(window=window, min_periods=1).min()
+    if op == "rolling_max":
+        return series.rolling(window=window, min_periods=1).max()
+    if op == "rolling_mean":
+        return series.rolling(window=window, min_periods=window).mean()
+    if op == "rolling_std":
+        return series.rolling(window=window, min_periods=window).std()
+    if op == "prev_rolling_mean":
+        return series.shift(1).rolling(window=window, min_periods=1).mean()
+    if op == "ema":
+        return series.ewm(span=window, adjust=False).mean()
+    if op == "diff":
+        return series.diff(window)
+    raise ValueError(f"Unknown intermediate operation: {op}")
+
+
+class IndicatorPlan:
+    """Execution plan for a set of indicators over one price panel"""
+
+    def __init__(self, names: Iterable[str], params: Optional[Dict[str, Dict]] = None):
+        params = params or {}
+        self.indicators: List[Indicator] = []
+        self.params: Dict[str, Dict] = {}
+        for name in dict.fromkeys(names):
+            if name not in REGISTRY:
+                raise ValueError(f"Unknown indicator: {name}")
+            indicator = REGISTRY[name]
+            self.indicators.append(indicator)
+            self.params[name] = {**indicator.defaults, **params.get(name, {})}
+
+        # 去除重複的中間值，保留宣告順序
+        specs: Dict[Spec, None] = {}
+        for indicator in self.indicators:
+            for spec in indicator.requires(self.params[indicator.name]):
+                specs[spec] = None
+        self.intermediates: List[Spec] = list(specs)
+
+    @property
+    def columns(self) -> List[str]:
+        """All output columns in plan order"""
+        return [col for indicator in self.indicators for col in indicator.columns(self.params[indicator.name])]
+
+    @property
+    def warmup(self) -> int:
+        """Bars needed before the first fully warmed-up value"""
+        return max((indicator.warmup(self.params[indicator.name]) for indicator in self.indicators), default=0)
+
+    def run(self, fields: Dict) -> Dict:
+        """Compute all indicators, returning {column: Series/DataFrame}"""
+        cache = {spec: _compute_intermediate(spec, fields) for spec in self.intermediates}
+        outputs = {}
+        for indicator in self.indicators:
+            outputs.update(indicator.compute(fields, cache, self.params[indicator.name]))
+        return outputs
+
+
+# ---------------------------------------------------------------------------
+# Built-in indicators
+# ---------------------------------------------------------------------------
+
+def _kd_compute(fields, cache, p):
+    n = p["window"]
+    k, d = kd.stochastic_kd(fields["Close"], cache[("rolling_min", "Low", n)], cache[("rolling_max", "High", n)])
+    return {"K": k, "D": d}
+
+
+register(Indicator(
+    name="KD",
+    columns=lambda p: ("K", "D"),
+    requires=lambda p: [("rolling_min", "Low", p["window"]), ("rolling_max", "High", p["window"])],
+    compute=_kd_compute,
+    # alpha=1/3 的兩層平滑，約 12 根後舊資料權重低於 1%
+    warmup=lambda p: p["window"] + 2 * 12,
+    defaults={"window": kd.KD_WINDOW},
+))
+
+
+def _rsi_compute(fields, cache, p):
+    n = p["window"]
+    change = cache[("diff", "Close", 1)]
+    gain = change.clip(lower=0).ewm(alpha=1 / n, adjust=False).mean()
+    loss = (-change.clip(upper=0)).ewm(alpha=1 / n, adjust=False).mean()
+    return {"RSI": 100 - 100 / (1 + gain / loss)}
+
+
+register(Indicator(
+    name="RSI",
+    columns=lambda p: ("RSI",),
+    requires=lambda p: [("diff", "Close", 1)],
+    compute=_rsi_compute,
+    warmup=lambda p: 3 * p["window"],
+    defaults={"window": 14},
+))
+
+
+def _macd_compute(fields, cache, p):
+    macd = cache[("ema", "Close", p["fast"])] - cache[("ema", "Close", p["slow"])]
+    signal = macd.ewm(span=p["signal"], adjust=False).mean()
+    return {"MACD": macd, "MACD_signal": signal, "MACD_hist": macd - signal}
+
+
+register(Indicator(
+    name="MACD",
+    columns=lambda p: ("MACD", "MACD_signal", "MACD_hist"),
+    requires=lambda p: [("ema", "Close", p["fast"]), ("ema", "Close", p["slow"])],
+    compute=_macd_compute,
+    warmup=lambda p: 3 * p["slow"] + p["signal"],
+    defaults={"fast": 12, "slow": 26, "signal": 9},
+))
+
+
+register(Indicator(
+    name="MA",
+    columns=lambda p: tuple(f"MA{n}" for n in p["windows"]),
+    requires=lambda p: [("rolling_mean", "Close", n) for n in p["windows"]],
+    compute=lambda fields, cache, p: {f"MA{n}": cache[("rolling_mean", "Close", n)] for n in p["windows"]},
+    warmup=lambda p: max(p["windows"]),
+    defaults={"windows": (5, 20, 60)},
+))
+
+
+def _bbands_compute(fields, cache, p):
+    n = p["window"]
+    mid = cache[("rolling_mean", "Close", n)]
+    width = cache[("rolling_std", "Close", n)] * p["num_std"]
+    return {"BB_mid": mid, "BB_upper": mid + width, "BB_lower": mid - width}
+
+
+register(Indicator(
+    name="BBANDS",
+    columns=lambda p: ("BB_mid", "BB_upper", "BB_lower"),
+    requires=lambda p: [("rolling_mean", "Close", p["window"]), ("rolling_std", "Close", p["window"])],
+    compute=_bbands_compute,
+    warmup=lambda p: p["window"],
+    defaults={"window": 20, "num_std": 2.0},
+))
+
+
+register(Indicator(
+    name="VOL_RATIO",
+    columns=lambda p: ("vol_ratio",),
+    requires=lambda p: [("prev_rolling_mean", "Volume", p["window"])],
+    compute=lambda fields, cache, p: {"vol_ratio": fields["Volume"] / cache[("prev_rolling_mean", "Volume", p["window"])]},
+    warmup=lambda p: p["window"] + 1,
+    defaults={"window": 5},
+))
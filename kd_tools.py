@@ -1,22 +1,51 @@
 """KD for tw stock"""
 import datetime
 
+import rules
+
+KD_WINDOW = 9  # k9 D9
+
+
+def stochastic_kd(close, low_min, high_max):
+    """Return (K, D) from close and the rolling low/high. Works on Series or wide DataFrames."""
+    rsv = (close - low_min) / (high_max - low_min) * 100
+    k = rsv.ewm(alpha=1 / 3).mean()
+    d = k.ewm(alpha=1 / 3).mean()
+    return k, d
+
+def kd_low_rule(k_num: float = 20, d_num: float = 20, name: str = "kd_low") -> dict:
+    """Screening rule: K and D both at or below their limits"""
+    return {
+        "name": name,
+        "window": "screen",
+        "when": {"all": [
+            {"col": "K", "op": "<=", "value": k_num},
+            {"col": "D", "op": "<=", "value": d_num},
+        ]},
+    }
+
 def calculate_kd(df):
     """This function is used to calculate KD for stock"""
     if not df.empty:
-        low_min = df["Low"].rolling(window=9, min_periods=1).min()  # k9 D9
-        high_max = df["High"].rolling(window=9, min_periods=1).max()  # k9 D9
-        rsv = (df["Close"] - low_min) / (high_max - low_min) * 100
-        df["K"] = rsv.ewm(alpha=1 / 3).mean()
-        df["D"] = df["K"].ewm(alpha=1 / 3).mean()
+        low_min = df["Low"].rolling(window=KD_WINDOW, min_periods=1).min()
+        high_max = df["High"].rolling(window=KD_WINDOW, min_periods=1).max()
+        df["K"], df["D"] = stochastic_kd(df["Close"], low_min, high_max)
         return df
     else:
         return None
 
-def filter_data_days(data,  days_in_advance: int = 1, k_num: int = 20, d_num: int = 20):
-    """This function is used to filter Taiwan stock dataframe"""
+def filter_data_days(data,  days_in_advance: int = 1, k_num: int = 20, d_num: int = 20, calendar=None):
+    """This function is used to filter Taiwan stock dataframe.
+
+    With a trading calendar, days_in_advance counts trading sessions (ending at the
+    latest session); without one it counts calendar days as before.
+    """
     today = datetime.datetime.now()
-    before = today - datetime.timedelta(days=days_in_advance)
+    if calendar is not None:
+        # 0 日與不帶行事曆時一致，只看最近一個交易日
+        before = calendar.sessions_back(max(days_in_advance, 1), today.date())[0]
+    else:
+        before = today - datetime.timedelta(days=days_in_advance)
     end = today.strftime("%Y-%m-%d")
     begin = before.strftime("%Y-%m-%d")
 
@@ -27,7 +56,7 @@ def filter_data(data,  begin_date: str, end_date: str, k_num: int = 20, d_num: i
 
     filtered_df = data.loc[begin_date:end_date]
 
-    # 在過濾後的資料中找到 KD 值小於或等於 20 的時間點
-    kd_below_20 = filtered_df[(filtered_df["K"] <= k_num) & (filtered_df["D"] <= d_num)]
+    # 在過濾後的資料中找到 KD 值小於或等於門檻的時間點
+    kd_below = filtered_df[rules.evaluate_frame(filtered_df, kd_low_rule(k_num, d_num))]
 
-    return kd_below_20
+    return kd_below
@@ -0,0 +1,279 @@
+"""Versioned TWSE/TPEX listing snapshots stored as row-level deltas in one SQLite file"""
+import sys
+import argparse
+import csv
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from peewee import (
+    CharField,
+    DateField,
+    Model,
+    SqliteDatabase,
+    TextField,
+    chunked,
+    fn,
+)
+
+db = SqliteDatabase(None)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "listings.db")
+EXCHANGES = {"TW": "twse", "TWO": "tpex"}
+INSERT_CHUNK_SIZE = 500
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class ListingDelta(BaseModel):
+    """A row that changed (upsert) or disappeared (delete) on effective_date"""
+    exchange = CharField()
+    code = CharField()
+    effective_date = DateField()
+    op = CharField()
+    payload = TextField(null=True)
+    row_hash = CharField(null=True)
+
+    class Meta:
+        table_name = "listing_delta"
+        indexes = (
+            (("exchange", "code", "effective_date"), True),
+            (("exchange", "effective_date"), False),
+        )
+
+
+class ListingLatest(BaseModel):
+    """Materialized latest state, i.e. the "latest" pointer for each company"""
+    exchange = CharField()
+    code = CharField()
+    effective_date = DateField()
+    payload = TextField()
+    row_hash = CharField()
+
+    class Meta:
+        table_name = "listing_latest"
+        indexes = ((("exchange", "code"), True),)
+
+
+class ListingHeader(BaseModel):
+    """Column header per exchange, as of the last ingest"""
+    exchange = CharField(primary_key=True)
+    header = TextField()
+    latest_date = DateField()
+
+    class Meta:
+        table_name = "listing_header"
+
+
+def _row_hash(payload: str) -> str:
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ListingStore:
+    """Snapshot store with latest / point-in-time reads and compaction"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db.init(path, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+        db.connect(reuse_if_open=True)
+        db.create_tables([ListingDelta, ListingLatest, ListingHeader])
+
+    def close(self) -> None:
+        if not db.is_closed():
+            db.close()
+
+    def ingest(self, exchange: str, header: List[str], rows: List[List[str]],
+               effective_date: Optional[datetime.date] = None) -> Tuple[int, int]:
+        """Store one full snapshot as deltas against the latest state. Returns (upserts, deletes)."""
+        effective_date = effective_date or datetime.date.today()
+        snapshot: Dict[str, str] = {}
+        for row in rows:
+            if not row or not str(row[0]).strip():
+                continue
+            snapshot[str(row[0]).strip()] = json.dumps(dict(zip(header, row)), ensure_ascii=False, sort_keys=True)
+
+        current = {
+            item.code: item.row_hash
+            for item in ListingLatest.select(ListingLatest.code, ListingLatest.row_hash)
+            .where(ListingLatest.exchange == exchange)
+        }
+
+        upserts = []
+        for code, payload in snapshot.items():
+            row_hash = _row_hash(payload)
+            if current.get(code) != row_hash:
+                upserts.append({"exchange": exchange, "code": code, "effective_date": effective_date,
+                                "op": "upsert", "payload": payload, "row_hash": row_hash})
+        deletes = [
+            {"exchange": exchange, "code": code, "effective_date": effective_date,
+             "op": "delete", "payload": None, "row_hash": None}
+            for code in current if code not in snapshot
+        ]
+
+        with db.atomic():
+            for batch in chunked(upserts + deletes, INSERT_CHUNK_SIZE):
+                ListingDelta.insert_many(batch).on_conflict_replace().execute()
+            for batch in chunked(upserts, INSERT_CHUNK_SIZE):
+                ListingLatest.insert_many([
+                    {key: item[key] for key in ("exchange", "code", "effective_date", "payload", "row_hash")}
+                    for item in batch
+                ]).on_conflict(
+                    conflict_target=[ListingLatest.exchange, ListingLatest.code],
+                    preserve=[ListingLatest.effective_date, ListingLatest.payload, ListingLatest.row_hash],
+                ).execute()
+            if deletes:
+                ListingLatest.delete().where(
+                    (ListingLatest.exchange == exchange)
+                    & (ListingLatest.code.in_([item["code"] for item in deletes]))
+                ).execute()
+            ListingHeader.insert(
+                exchange=exchange, header=json.dumps(header, ensure_ascii=False), latest_date=effective_date
+            ).on_conflict_replace().execute()
+        return len(upserts), len(deletes)
+
+    def header(self, exchange: str) -> Optional[List[str]]:
+        item = ListingHeader.get_or_none(ListingHeader.exchange == exchange)
+        return json.loads(item.header) if item else None
+
+    def latest_date(self, exchange: str) -> Optional[datetime.date]:
+        item = ListingHeader.get_or_none(ListingHeader.exchange == exchange)
+        return item.latest_date if item else None
+
+    def latest(self, exchange: str) -> Dict[str, Dict[str, str]]:
+        """Current listings {code: {column: value}} from the latest pointer table"""
+        query = ListingLatest.select(ListingLatest.code, ListingLatest.payload).where(ListingLatest.exchange == exchange)
+        return {item.code: json.loads(item.payload) for item in query}
+
+    def as_of(self, exchange: str, day: datetime.date) -> Dict[str, Dict[str, str]]:
+        """Listings as they were on `day` (the newest delta on or before it, per company)"""
+        newest = (ListingDelta
+                  .select(ListingDelta.code, fn.MAX(ListingDelta.effective_date).alias("max_date"))
+                  .where((ListingDelta.exchange == exchange) & (ListingDelta.effective_date <= day))
+                  .group_by(ListingDelta.code)
+                  .alias("newest"))
+        query = (ListingDelta
+                 .select(ListingDelta.code, ListingDelta.op, ListingDelta.payload)
+                 .join(newest, on=((ListingDelta.code == newest.c.code)
+                                   & (ListingDelta.effective_date == newest.c.max_date)))
+                 .where(ListingDelta.exchange == exchange))
+        return {item.code: json.loads(item.payload) for item in query if item.op == "upsert"}
+
+    def compact(self, before: datetime.date) -> int:
+        """Fold history older than `before` into one baseline row per company. Returns rows removed.
+
+        Point-in-time reads on or after `before` are unchanged; earlier dates are no longer available.
+        """
+        removed = 0
+        with db.atomic():
+            for exchange in EXCHANGES:
+                baseline = {
+                    item.code: (item.op, item.effective_date)
+                    for item in self._newest_before(exchange, before)
+                }
+                for code, (op, effective_date) in baseline.items():
+                    older = (ListingDelta.exchange == exchange) & (ListingDelta.code == code) & (
+                        ListingDelta.effective_date < effective_date)
+                    if op == "delete":
+                        # 已下市且早於保留期限，整段歷史都不需要
+                        older = (ListingDelta.exchange == exchange) & (ListingDelta.code == code) & (
+                            ListingDelta.effective_date <= effective_date)
+                    removed += ListingDelta.delete().where(older).execute()
+        db.execute_sql("VACUUM")
+        return removed
+
+    def _newest_before(self, exchange: str, before: datetime.date):
+        newest = (ListingDelta
+                  .select(ListingDelta.code, fn.MAX(ListingDelta.effective_date).alias("max_date"))
+                  .where((ListingDelta.exchange == exchange) & (ListingDelta.effective_date < before))
+                  .group_by(ListingDelta.code)
+                  .alias("newest"))
+        return (ListingDelta
+                .select(ListingDelta.code, ListingDelta.op, ListingDelta.effective_date)
+                .join(newest, on=((ListingDelta.code == newest.c.code)
+                                  & (ListingDelta.effective_date == newest.c.max_date)))
+                .where(ListingDelta.exchange == exchange))
+
+    def export_csv(self, exchange: str, path: str, day: Optional[datetime.date] = None) -> int:
+        """Write a snapshot in the same layout update_listings used to produce. Returns rows written."""
+        header = self.header(exchange) or []
+        rows = self.as_of(exchange, day) if day else self.latest(exchange)
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for code in sorted(rows):
+                writer.writerow([rows[code].get(col, "") for col in header])
+        return len(rows)
+
+    def import_csv_dir(self, data_dir: str) -> int:
+        """Migrate dated twse_YYYYMMDD.csv / tpex_YYYYMMDD.csv files, oldest first. Returns files imported."""
+        imported = 0
+        for exchange, prefix in EXCHANGES.items():
+            for path in sorted(glob.glob(os.path.join(data_dir, f"{prefix}_*.csv"))):
+                match = re.search(r"_(\d{8})\.csv$", path)
+                if not match:
+                    continue
+                effective_date = datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+                with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                    reader = csv.reader(f)
+                    header = next(reader, None)
+                    if header:
+                        self.ingest(exchange, header, list(reader), effective_date)
+                        imported += 1
+        return imported
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            exchange: {
+                "latest_date": str(self.latest_date(exchange)),
+                "companies": ListingLatest.select().where(ListingLatest.exchange == exchange).count(),
+                "deltas": ListingDelta.select().where(ListingDelta.exchange == exchange).count(),
+            }
+            for exchange in EXCHANGES
+        }
+
+
+def _parse_date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def main():
+    """Maintenance commands for the listing snapshot store"""
+    parser = argparse.ArgumentParser(description="TWSE/TPEX listing snapshot store")
+    parser.add_argument("--db", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats")
+    export = sub.add_parser("export", help="write a snapshot to csv")
+    export.add_argument("exchange", choices=list(EXCHANGES))
+    export.add_argument("output")
+    export.add_argument("--as-of", type=_parse_date)
+    compact = sub.add_parser("compact", help="drop history older than the retention period")
+    compact.add_argument("--keep-days", type=int, default=365)
+    migrate = sub.add_parser("import", help="import dated csv snapshots from a directory")
+    migrate.add_argument("data_dir")
+    args = parser.parse_args()
+
+    store = ListingStore(args.db)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=4, ensure_ascii=False))
+    elif args.command == "export":
+        count = store.export_csv(args.exchange, args.output, args.as_of)
+        print(f"{count} rows written to {args.output}")
+    elif args.command == "compact":
+        before = datetime.date.today() - datetime.timedelta(days=args.keep_days)
+        print(f"{store.compact(before)} delta rows older than {before} removed")
+    else:
+        print(f"{store.import_csv_dir(args.data_dir)} files imported")
+    store.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
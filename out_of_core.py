@@ -0,0 +1,159 @@
+"""Out-of-core KD screening over the on-disk price store in date x ticker chunks"""
+import glob
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import rules
+from price_store import FIELDS, PriceStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 除價格與指標外，pandas 運算時的暫存複本估計倍數
+WORKING_COPIES = 3
+MIN_CHUNK_ROWS = 250
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (0 when unavailable)"""
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class OutOfCoreRunner:
+    """Screen the whole stored history with bounded memory.
+
+    Tickers are split into column chunks and each column chunk is walked through
+    time in row chunks. The last `plan.warmup` raw bars of a row chunk are carried
+    into the next one, which is the state every indicator needs: rolling windows
+    are exact and the EMAs continue within the warm-up tolerance the plan already
+    uses for downloads. Per-chunk results are appended to spill files, and the
+    final reports are assembled by streaming those files. Screening uses the same
+    rule engine as the daily run.
+    """
+
+    def __init__(self, store: PriceStore, plan: indicators.IndicatorPlan, engine: rules.RuleEngine,
+                 memory_budget_mb: float, spill_dir: str, log):
+        self.store = store
+        self.plan = plan
+        self.engine = engine
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+        self.log = log
+
+    def chunk_shape(self, n_tickers: int) -> Tuple[int, int]:
+        """(tickers per chunk, new rows per chunk) that fit the memory budget"""
+        frames = len(FIELDS) + len(self.plan.intermediates) + len(self.plan.columns)
+        cells = max(1, int(self.memory_budget // (8 * frames * WORKING_COPIES)))
+        overlap = self.plan.warmup
+        width = max(1, min(n_tickers, cells // (overlap + MIN_CHUNK_ROWS)))
+        rows = max(1, cells // width - overlap)
+        return width, rows
+
+    def _spill(self, kind: str, chunk_no: int, frame: pd.DataFrame) -> None:
+        if frame.empty:
+            return
+        path = os.path.join(self.spill_dir, f"{kind}_{chunk_no:05d}.csv")
+        frame.to_csv(path, mode="a", header=not os.path.exists(path), encoding="utf-8")
+
+    def _assemble(self, kind: str, output: str) -> int:
+        """Concatenate spill files into one report without loading them. Returns data rows."""
+        parts = sorted(glob.glob(os.path.join(self.spill_dir, f"{kind}_*.csv")))
+        rows = 0
+        with open(output, "w", encoding="utf-8-sig", newline="") as out:
+            for i, part in enumerate(parts):
+                with open(part, "r", encoding="utf-8", newline="") as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    for line in f:
+                        out.write(line)
+                        rows += 1
+                os.remove(part)
+        return rows
+
+    @staticmethod
+    def _rows(values: Dict[str, np.ndarray], dates: pd.DatetimeIndex, tickers: np.ndarray,
+              meta: pd.DataFrame, row_pos: np.ndarray, col_pos: np.ndarray, columns: List[str]) -> pd.DataFrame:
+        """Report-layout rows for the selected (row, column) positions"""
+        ids = tickers[col_pos]
+        frame = pd.DataFrame({
+            "id": pd.Series(ids).str.replace(r"\.TWO$|\.TW$", "", regex=True).to_numpy(),
+            "name": meta["name"].reindex(ids).to_numpy(),
+            "industry": meta["industry"].reindex(ids).to_numpy(),
+            **{col: values[col][row_pos, col_pos] for col in columns if col in values},
+        }, index=dates[row_pos])
+        frame.index.name = "Date"
+        return frame
+
+    def run(self, tickers: Sequence[str], meta: pd.DataFrame, report_columns: List[str],
+            scan_days: int, outputs: Dict[str, str]) -> Dict[str, int]:
+        """Screen `tickers` and write one report per rule, plus "latest", to the paths in `outputs`.
+
+        meta is indexed by ticker with name and industry columns. scan_days limits the
+        sessions searched by "screen" window rules (0 = whole history); "last" window
+        rules only see the newest session.
+        """
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for kind in outputs:
+            for stale in glob.glob(os.path.join(self.spill_dir, f"{kind}_*.csv")):
+                os.remove(stale)
+
+        stored = set(self.store.tickers)
+        tickers = [ticker for ticker in tickers if ticker in stored]
+        n_dates = len(self.store.dates)
+        if not tickers or n_dates == 0:
+            self.log.warning("Price store has no data for the selected tickers")
+            return {kind: 0 for kind in outputs}
+
+        overlap = self.plan.warmup
+        width, rows = self.chunk_shape(len(tickers))
+        scan_start = max(0, n_dates - scan_days) if scan_days else 0
+        first_row = max(0, scan_start - overlap)
+        n_chunks = -(-len(tickers) // width) * -(-(n_dates - first_row) // rows)
+        self.log.info("Out-of-core scan: %d tickers x %d sessions in %d chunks (%d tickers x %d rows, %d carried)",
+                      len(tickers), n_dates - scan_start, n_chunks, width, rows, overlap)
+
+        for chunk_no, col_start in enumerate(range(0, len(tickers), width)):
+            chunk_tickers = tickers[col_start:col_start + width]
+            ticker_array = np.asarray(chunk_tickers, dtype=object)
+            carry: Dict[str, pd.DataFrame] = {}
+            for row_start in range(first_row, n_dates, rows):
+                row_stop = min(row_start + rows, n_dates)
+                fresh = self.store.read_panel(row_start, row_stop, chunk_tickers)
+                # 前一段最後 overlap 根K棒接在前面，作為指標狀態
+                fields = {name: pd.concat([carry[name], frame]) if carry else frame
+                          for name, frame in fresh.items()}
+                columns = {**fields, **self.plan.run(fields)}
+                skip = len(fields["Close"]) - len(fresh["Close"])
+                final = row_stop == n_dates
+
+                # 接上的K棒只提供狀態與前一根的比較，不重複輸出
+                positions = np.arange(row_start - skip, row_stop)
+                screen = (positions >= max(scan_start, overlap)) & (positions >= row_start)
+                last = final & (positions == n_dates - 1)
+                hits = self.engine.evaluate(columns, {"screen": screen, "last": last})
+
+                dates = columns["Close"].index
+                values = {name: frame.to_numpy() for name, frame in columns.items()}
+                for name, (row_pos, col_pos) in hits.items():
+                    self._spill(name, chunk_no, self._rows(values, dates, ticker_array, meta,
+                                                           row_pos, col_pos, report_columns))
+                if final:
+                    latest_pos = np.flatnonzero(~np.isnan(values["Close"][-1]))
+                    self._spill("latest", chunk_no, self._rows(values, dates, ticker_array, meta,
+                                                               np.full(len(latest_pos), len(dates) - 1),
+                                                               latest_pos, report_columns))
+                carry = {name: frame.tail(overlap) for name, frame in fields.items()} if overlap else {}
+                del fresh, fields, columns, values
+
+        counts = {kind: self._assemble(kind, path) for kind, path in outputs.items()}
+        self.log.info("Out-of-core scan finished: %s, peak RSS %.0f MB", counts, peak_rss_mb())
+        return counts
@@ -1,5 +1,24 @@
 """pick up potential stars TW stock """
+import pandas as pd
+
 import logger
+import rules
+
+
+def star_rule(multiple: float = 3.0, name: str = "potential_star") -> dict:
+    """Screening rule: close above the previous close and volume above `multiple` times the previous volume.
+
+    Evaluated on the last bar; the previous bar is included in the result.
+    """
+    return {
+        "name": name,
+        "window": "last",
+        "context_bars": 1,
+        "when": {"all": [
+            {"col": "Close", "op": ">", "ref": "Close", "shift": 1},
+            {"col": "Volume", "op": ">", "ref": "Volume", "shift": 1, "mult": multiple},
+        ]},
+    }
 
 
 def is_potential_star(df1, df2, log, multiple: float = 3.0) -> bool:
@@ -21,17 +40,10 @@ def is_potential_star(df1, df2, log, multiple: float = 3.0) -> bool:
         log.info("input is empty!")
         return False
 
-    log.info("判斷最近一筆資料的收盤價是否大於前一天")
-    price_change = float(df1.loc["Close"]) - float(df2.loc["Close"])
-    if price_change > 0:
-        log.info("股價收盤價大於前一天收盤價，判斷股價上漲")
-        log.info("再判斷最近一筆成交量是否大於%.1f倍", multiple)
-        volume_spike = float(df1.loc["Volume"]) > (float(df2.loc["Volume"]) * multiple)
-        if volume_spike:
-            log.info("最近一筆成交量大於前一天成交量%.1f倍，為潛在飆股", multiple)
-            return True
-        else:
-            log.info("最近一筆資料的成交量沒有大於前一天%.1f倍", multiple)
-    else:
-        log.info("最近一筆資料的收盤價沒有大於前一天，股價下跌")
+    # 前一天在前、最近一筆在後，以規則判斷最後一筆
+    frame = pd.DataFrame([df2, df1])[["Close", "Volume"]].astype(float)
+    if rules.evaluate_frame(frame, star_rule(multiple))[-1]:
+        log.info("最近一筆收盤價上漲且成交量大於前一天%.1f倍，為潛在飆股", multiple)
+        return True
+    log.info("最近一筆資料未同時符合股價上漲與成交量大於前一天%.1f倍", multiple)
     return False
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""On-disk price history: one date-major float64 matrix per field, read through memory maps"""
+import sys
+import argparse
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+INDEX_FILE = "index.json"
+# 重寫檔案時每次搬移的列數，控制記憶體用量
+COPY_BLOCK_ROWS = 256
+
+
+class PriceStore:
+    """Price matrices of shape (dates, tickers) stored as raw float64 files.
+
+    New dates are appended in place. New tickers, or dates older than the stored
+    history, rewrite the files block by block, so memory use stays bounded.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.dates = pd.DatetimeIndex([])
+        self.tickers = pd.Index([], dtype=object)
+        index_path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.dates = pd.DatetimeIndex(pd.to_datetime(index["dates"]))
+            self.tickers = pd.Index(index["tickers"], dtype=object)
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.tickers)
+
+    def _path(self, field_name: str) -> str:
+        return os.path.join(self.root, f"{field_name}.f8")
+
+    def _save_index(self) -> None:
+        index_path = os.path.join(self.root, INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dates": [day.strftime("%Y-%m-%d") for day in self.dates],
+                "tickers": list(self.tickers),
+                "fields": list(FIELDS),
+            }, f)
+        os.replace(tmp_path, index_path)
+
+    def _open(self, field_name: str, mode: str = "r") -> Optional[np.memmap]:
+        if 0 in self.shape:
+            return None
+        return np.memmap(self._path(field_name), dtype=np.float64, mode=mode, shape=self.shape)
+
+    def _extend_dates(self, new_dates: pd.DatetimeIndex) -> None:
+        """Append NaN rows for dates after the stored history"""
+        blank = np.full((COPY_BLOCK_ROWS, len(self.tickers)), np.nan).tobytes()
+        for field_name in FIELDS:
+            with open(self._path(field_name), "ab") as f:
+                remaining = len(new_dates)
+                while remaining > 0:
+                    rows = min(remaining, COPY_BLOCK_ROWS)
+                    f.write(blank[:rows * len(self.tickers) * 8])
+                    remaining -= rows
+        self.dates = self.dates.append(new_dates)
+
+    def _rewrite(self, dates: pd.DatetimeIndex, tickers: pd.Index) -> None:
+        """Rewrite every field with a wider ticker set and/or earlier dates"""
+        row_map = dates.get_indexer(self.dates)
+        col_map = tickers.get_indexer(self.tickers)
+        for field_name in FIELDS:
+            tmp_path = self._path(field_name) + ".tmp"
+            target = np.memmap(tmp_path, dtype=np.float64, mode="w+", shape=(len(dates), len(tickers)))
+            for start in range(0, len(dates), COPY_BLOCK_ROWS):
+                target[start:start + COPY_BLOCK_ROWS] = np.nan
+            source = self._open(field_name)
+            if source is not None:
+                for start in range(0, len(self.dates), COPY_BLOCK_ROWS):
+                    stop = min(start + COPY_BLOCK_ROWS, len(self.dates))
+                    target[np.ix_(row_map[start:stop], col_map)] = source[start:stop]
+                del source
+            target.flush()
+            del target
+            os.replace(tmp_path, self._path(field_name))
+        self.dates, self.tickers = dates, tickers
+
+    def append(self, panel: Dict[str, pd.DataFrame]) -> int:
+        """Merge a {field: date x ticker} panel into the store. Returns cells written.
+
+        Missing (NaN) values never overwrite stored ones, so a failed or partial
+        download leaves the existing history intact.
+        """
+        close = panel["Close"]
+        # 完全沒有資料的股票不加入價格庫
+        close = close.loc[:, close.notna().any().to_numpy()]
+        if close.empty:
+            return 0
+        dates = pd.DatetimeIndex(pd.to_datetime(close.index)).normalize()
+        tickers = pd.Index(close.columns, dtype=object)
+
+        new_tickers = tickers.difference(self.tickers)
+        new_dates = dates.difference(self.dates)
+        if len(new_tickers) or (len(new_dates) and len(self.dates) and new_dates.min() < self.dates.max()) \
+                or 0 in self.shape:
+            self._rewrite(self.dates.union(new_dates), self.tickers.append(new_tickers))
+        elif len(new_dates):
+            self._extend_dates(new_dates.sort_values())
+
+        rows = self.dates.get_indexer(dates)
+        cols = self.tickers.get_indexer(tickers)
+        for field_name in FIELDS:
+            target = self._open(field_name, "r+")
+            values = panel[field_name].reindex(index=close.index, columns=close.columns).to_numpy(dtype=np.float64)
+            existing = target[np.ix_(rows, cols)]
+            target[np.ix_(rows, cols)] = np.where(np.isnan(values), existing, values)
+            target.flush()
+            del target
+        self._save_index()
+        return len(rows) * len(cols)
+
+    def read(self, field_name: str, start: int, stop: int, tickers: Sequence[str]) -> pd.DataFrame:
+        """Rows [start, stop) for the given tickers, copied out of the memory map"""
+        cols = self.tickers.get_indexer(list(tickers))
+        if (cols < 0).any():
+            raise KeyError(f"Tickers not in price store: {list(np.asarray(tickers)[cols < 0])[:10]}")
+        source = self._open(field_name)
+        values = np.array(source[start:stop][:, cols]) if source is not None else np.empty((0, len(cols)))
+        del source
+        return pd.DataFrame(values, index=self.dates[start:stop], columns=list(tickers))
+
+    def read_panel(self, start: int, stop: int, tickers: Sequence[str],
+                   fields: Sequence[str] = FIELDS) -> Dict[str, pd.DataFrame]:
+        return {field_name: self.read(field_name, start, stop, tickers) for field_name in fields}
+
+    def stats(self) -> Dict:
+        return {
+            "dates": len(self.dates),
+            "first": self.dates[0].strftime("%Y-%m-%d") if len(self.dates) else None,
+            "last": self.dates[-1].strftime("%Y-%m-%d") if len(self.dates) else None,
+            "tickers": len(self.tickers),
+            "bytes": sum(os.path.getsize(self._path(name)) for name in FIELDS if os.path.exists(self._path(name))),
+        }
+
+
+def main():
+    """Inspect the price store"""
+    parser = argparse.ArgumentParser(description="On-disk price history")
+    parser.add_argument("--root", default=os.path.join("data", "prices"))
+    parser.add_argument("command", choices=["stats"])
+    args = parser.parse_args()
+    print(json.dumps(PriceStore(args.root).stats(), indent=4))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
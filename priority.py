@@ -0,0 +1,38 @@
+"""Scan order for deadline-bound runs: watchlist first, then liquidity and recent signal history"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _code(ticker: str) -> str:
+    return ticker.rsplit(".", 1)[0] if ticker.endswith((".TW", ".TWO")) else ticker
+
+
+def priority_order(tickers: List[str], watchlist: Iterable[str], price_stats: pd.DataFrame,
+                   signal_hits: Dict[str, int]) -> Tuple[List[str], List[str]]:
+    """Return (watchlist tickers, remaining tickers best first).
+
+    watchlist entries may omit the exchange suffix. The remaining tickers are ordered by
+    the sum of their percentile ranks in average turnover (avg_volume x last_close) and
+    in recent signal count; unknown values rank lowest, ties keep the stock-list order.
+    """
+    wanted = {_code(str(item)) for item in watchlist}
+    watch = [ticker for ticker in tickers if _code(ticker) in wanted]
+    rest = [ticker for ticker in tickers if _code(ticker) not in wanted]
+    if not rest:
+        return watch, rest
+
+    frame = pd.DataFrame(index=pd.Index(rest, name="ticker"))
+    if not price_stats.empty:
+        stats = price_stats.reindex(frame.index)
+        frame["turnover"] = stats["avg_volume"] * stats["last_close"]
+    else:
+        frame["turnover"] = np.nan
+    frame["hits"] = [signal_hits.get(_code(ticker), 0) for ticker in rest]
+
+    # 百分位排名相加，缺值視為最低
+    score = (frame["turnover"].rank(pct=True).fillna(0.0)
+             + frame["hits"].where(frame["hits"] > 0).rank(pct=True).fillna(0.0))
+    order = np.argsort(-score.to_numpy(), kind="stable")
+    return watch, [rest[i] for i in order]
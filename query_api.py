@@ -0,0 +1,274 @@
+"""
+本機查詢服務：以 HTTP/JSON 提供最新一次 KD、潛力股與個股指標結果
+"""
+import sys
+import datetime
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import logger
+from signal_store import SignalStore
+from yahooBot import load_config
+
+
+INDEXED_COLUMNS = ["id", "industry", "date"]
+SORTABLE_COLUMNS = ["K", "D", "vol_ratio", "Volume", "Close", "date", "id"]
+RELOAD_CHECK_INTERVAL = 10  # 秒
+DEFAULT_LIMIT = 100
+
+# 報表種類與訊號資料庫中的 kind
+SIGNAL_KINDS = {"kd": "kd", "stars": "star"}
+
+# 報表種類與檔名樣式
+REPORT_PATTERNS = {
+    "kd": "kd*_TW_*.csv",
+    "stars": "stars_TW_*.csv",
+    "indicators": "indicators_TW_*.csv",
+    "breadth": "breadth_TW_*.csv",
+}
+
+
+class IndexedTable:
+    """唯讀的欄式資料表，對 ticker、產業與日期建立次要索引"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.size = len(df)
+        self.columns: Dict[str, np.ndarray] = {col: df[col].to_numpy() for col in df.columns}
+        self.indexes: Dict[str, Dict[str, np.ndarray]] = {}
+        for col in INDEXED_COLUMNS:
+            if col not in self.columns:
+                continue
+            keys = self.columns[col].astype(str)
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            uniques, starts = np.unique(sorted_keys, return_index=True)
+            bounds = list(starts[1:]) + [len(sorted_keys)]
+            self.indexes[col] = {
+                key: np.sort(order[start:end]) for key, start, end in zip(uniques, starts, bounds)
+            }
+
+    def _lookup(self, col: str, values: List[str]) -> Optional[np.ndarray]:
+        """以索引查出符合任一值的列位置"""
+        index = self.indexes.get(col)
+        if index is None:
+            return None
+        hits = [index[value] for value in values if value in index]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(hits))
+
+    def query(self, params: Dict[str, List[str]]) -> List[Dict]:
+        """依查詢參數篩選、排序並回傳資料列"""
+        positions = np.arange(self.size)
+
+        # 先用索引縮小候選集合
+        for col, param in (("id", "ticker"), ("industry", "industry"), ("date", "date")):
+            if param in params:
+                values = [v for raw in params[param] for v in raw.split(",") if v]
+                hits = self._lookup(col, values)
+                if hits is not None:
+                    positions = np.intersect1d(positions, hits, assume_unique=True)
+
+        # 再以向量化條件過濾數值欄位
+        for col in ("K", "D", "vol_ratio", "Volume", "Close"):
+            values = self.columns.get(col)
+            if values is None:
+                continue
+            low = params.get(f"{col}_min") or params.get(f"{col.lower()}_min")
+            high = params.get(f"{col}_max") or params.get(f"{col.lower()}_max")
+            if low:
+                positions = positions[values[positions].astype(float) >= float(low[0])]
+            if high:
+                positions = positions[values[positions].astype(float) <= float(high[0])]
+
+        if "date_from" in params and "date" in self.columns:
+            positions = positions[self.columns["date"][positions].astype(str) >= params["date_from"][0]]
+        if "date_to" in params and "date" in self.columns:
+            positions = positions[self.columns["date"][positions].astype(str) <= params["date_to"][0]]
+
+        sort_col = params.get("sort", [None])[0]
+        if sort_col:
+            if sort_col not in SORTABLE_COLUMNS or sort_col not in self.columns:
+                raise ValueError(f"Cannot sort by {sort_col}")
+            keys = self.columns[sort_col][positions]
+            if sort_col in ("date", "id"):
+                order = np.argsort(keys.astype(str), kind="stable")
+            else:
+                keys = keys.astype(float)
+                # NaN 一律排在最後
+                keys = np.where(np.isnan(keys), np.inf, keys)
+                order = np.argsort(keys, kind="stable")
+            if params.get("order", ["asc"])[0] == "desc":
+                order = order[::-1]
+            positions = positions[order]
+
+        offset = int(params.get("offset", [0])[0])
+        limit = int(params.get("limit", [DEFAULT_LIMIT])[0])
+        positions = positions[offset:offset + limit]
+
+        return [
+            {col: _json_value(values[pos]) for col, values in self.columns.items()}
+            for pos in positions
+        ]
+
+
+def _json_value(value):
+    """將 numpy 型別轉為可序列化的 JSON 值"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ResultStore:
+    """保存最新一份報表的記憶體快照，報表更新時自動重新載入"""
+
+    def __init__(self, report_dir: Path, log, signal_db: Optional[str] = None):
+        self.report_dir = report_dir
+        self.log = log
+        # 有訊號資料庫時，KD 與潛力股直接讀取資料庫最新一次執行結果
+        self.signal_store = SignalStore(signal_db) if signal_db and Path(signal_db).exists() else None
+        self.tables: Dict[str, IndexedTable] = {}
+        self.files: Dict[str, Optional[str]] = {}
+        self.loaded_at: Optional[str] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _latest_files(self) -> Dict[str, Optional[str]]:
+        """找出各種報表的最新檔案"""
+        latest = {}
+        for name, pattern in REPORT_PATTERNS.items():
+            candidates = sorted(self.report_dir.glob(pattern), key=lambda p: p.stem.rsplit("_", 1)[-1])
+            latest[name] = str(candidates[-1]) if candidates else None
+        if self.signal_store:
+            for name, kind in SIGNAL_KINDS.items():
+                run_id = self.signal_store.latest_run_id(kind)
+                latest[name] = f"signals:{kind}@{run_id}" if run_id else None
+        return latest
+
+    def reload(self) -> None:
+        """讀取最新報表並建立索引"""
+        files = self._latest_files()
+        tables = {}
+        for name, path in files.items():
+            if path is None:
+                tables[name] = IndexedTable(pd.DataFrame())
+                continue
+            if path.startswith("signals:"):
+                df = self.signal_store.latest_run(SIGNAL_KINDS[name]).drop(columns=["run_date", "kind"])
+            else:
+                df = pd.read_csv(path, index_col=0, encoding="utf-8-sig", dtype={"id": str})
+            df.index.name = "date"
+            df = df.reset_index()
+            df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+            tables[name] = IndexedTable(df)
+            self.log.info("Query store loaded %d rows from %s", len(df), path)
+
+        # 以整組替換，查詢中的執行緒仍可安全使用舊快照
+        self.tables = tables
+        self.files = files
+        self.loaded_at = datetime.datetime.now().isoformat(timespec="seconds")
+
+    def refresh_if_needed(self) -> None:
+        """定期檢查是否有新報表"""
+        now = time.time()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if now - self._last_check < RELOAD_CHECK_INTERVAL:
+                return
+            self._last_check = now
+            try:
+                if self._latest_files() != self.files:
+                    self.reload()
+            except Exception as e:
+                # 報表可能正在寫入，保留目前的快照，下次檢查時再重新載入
+                self.log.warning("Reload failed, keeping the previous results: %s", e)
+
+    def health(self) -> Dict:
+        """服務狀態"""
+        return {
+            "status": "ok",
+            "loaded_at": self.loaded_at,
+            "files": self.files,
+            "rows": {name: table.size for name, table in self.tables.items()},
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """HTTP 請求處理"""
+
+    store: ResultStore = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        try:
+            self.store.refresh_if_needed()
+            tables = self.store.tables
+            if not parts or parts[0] == "health":
+                self._send(200, self.store.health())
+            elif parts[0] in tables and len(parts) == 1:
+                rows = tables[parts[0]].query(params)
+                self._send(200, {"count": len(rows), "rows": rows})
+            elif parts[0] == "ticker" and len(parts) == 2:
+                ticker_params = dict(params, ticker=[parts[1]])
+                self._send(200, {
+                    "ticker": parts[1],
+                    # 產業廣度沒有個股欄位，不列入個股查詢
+                    **{name: table.query(ticker_params) for name, table in tables.items()
+                       if name != "breadth"},
+                })
+            else:
+                self._send(404, {"error": f"Unknown path {url.path}"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self.store.log.exception("Query %s failed: %s", url.path, e)
+            self._send(500, {"error": "Internal error"})
+
+    def _send(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """改用專案 logger，避免輸出到 stderr"""
+        self.store.log.debug("%s - %s", self.address_string(), format % args)
+
+
+def main():
+    """主函數"""
+    config = load_config()
+    log = logger.get_log("log_config.yaml")
+    QueryHandler.store = ResultStore(Path.cwd() / config.REPORT_DIR, log, config.SIGNAL_DB)
+
+    server = ThreadingHTTPServer((config.QUERY_API_HOST, config.QUERY_API_PORT), QueryHandler)
+    log.info("Query API listening on http://%s:%d", config.QUERY_API_HOST, config.QUERY_API_PORT)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nQuery API stopped")
+    finally:
+        server.server_close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Score KD candidates across the universe and keep the top K per market and per industry"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# 各評分項目的預設權重，設為 0 即不採計
+DEFAULT_WEIGHTS = {
+    "depth": 1.0,
+    "cross": 1.0,
+    "vol_ratio": 0.5,
+    "liquidity": 0.5,
+    "star": 0.5,
+}
+
+RANK_COLUMNS = ["id", "name", "industry", "market", "score", "hits", "depth", "cross",
+                "vol_ratio", "liquidity", "star", "Close", "K", "D", "Volume", "rank_market", "rank_industry"]
+
+
+def _zscore(values: pd.Series) -> pd.Series:
+    """Cross-sectional standardisation; a constant or missing feature contributes 0"""
+    std = values.std()
+    if not std or np.isnan(std):
+        return pd.Series(0.0, index=values.index)
+    return ((values - values.mean()) / std).fillna(0.0)
+
+
+def score_candidates(kd_df: pd.DataFrame, latest: pd.DataFrame, kd_limit: float,
+                     liquidity: Optional[pd.Series] = None, star_ids=(),
+                     weights: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """One scored row per ticker that appears in kd_df.
+
+    kd_df holds every bar under the limit (report layout), latest holds the newest bar
+    per ticker. liquidity is average daily turnover indexed by ticker.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    if kd_df.empty or latest.empty:
+        return pd.DataFrame(columns=RANK_COLUMNS)
+
+    # 區間內最深的一根與命中次數
+    grouped = kd_df.groupby("id")
+    deepest = grouped[["K", "D"]].min()
+    frame = latest.drop_duplicates(subset="id", keep="last").set_index("id")
+    frame = frame.loc[frame.index.intersection(deepest.index)]
+    deepest = deepest.loc[frame.index]
+
+    frame["hits"] = grouped.size().loc[frame.index]
+    frame["market"] = np.where(frame.index.str.endswith(".TWO"), "TWO", "TW")
+    # 低於門檻的幅度（0~1），K、D 各半
+    frame["depth"] = ((kd_limit - deepest[["K", "D"]]).clip(lower=0) / kd_limit).mean(axis=1)
+    # 最新一根 K 在 D 之上的幅度（0~1），上限避免獎勵已遠離低檔的股票
+    frame["cross"] = ((frame["K"] - frame["D"]) / kd_limit).clip(lower=0, upper=1)
+    if liquidity is not None:
+        frame["liquidity"] = liquidity.reindex(frame.index)
+    else:
+        frame["liquidity"] = frame["Close"] * frame["Volume"]
+    frame["star"] = frame.index.isin(list(star_ids)).astype(float)
+
+    # 量比與成交金額取對數，避免少數極端值主導分數
+    features = {
+        "depth": frame["depth"],
+        "cross": frame["cross"],
+        "vol_ratio": np.log1p(frame["vol_ratio"].clip(lower=0)),
+        "liquidity": np.log10(frame["liquidity"].clip(lower=1)),
+        "star": frame["star"],
+    }
+    frame["score"] = 0.0
+    for name, weight in weights.items():
+        if weight and name in features:
+            frame["score"] += weight * _zscore(features[name])
+    return frame.rename_axis("id").reset_index()
+
+
+def _top_positions(scores: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k best scores among `positions`, best first (partial selection)"""
+    if k <= 0 or len(positions) == 0:
+        return positions[:0]
+    group_scores = scores[positions]
+    if len(positions) > k:
+        # 只做部分選取，不排序整組
+        picked = np.argpartition(-group_scores, k - 1)[:k]
+    else:
+        picked = np.arange(len(positions))
+    # 只排序選出的 k 筆
+    picked = picked[np.argsort(-group_scores[picked], kind="stable")]
+    return positions[picked]
+
+
+def select_top(scored: pd.DataFrame, top_market: int, top_industry: int) -> pd.DataFrame:
+    """Union of the top `top_market` per market and top `top_industry` per industry"""
+    if scored.empty:
+        return pd.DataFrame(columns=RANK_COLUMNS)
+    scores = scored["score"].to_numpy(dtype=float)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+
+    rank_market = np.zeros(len(scored), dtype=int)
+    rank_industry = np.zeros(len(scored), dtype=int)
+    for positions in scored.groupby("market", sort=False).indices.values():
+        best = _top_positions(scores, positions, top_market)
+        rank_market[best] = np.arange(1, len(best) + 1)
+    for positions in scored.groupby("industry", sort=False).indices.values():
+        best = _top_positions(scores, positions, top_industry)
+        rank_industry[best] = np.arange(1, len(best) + 1)
+
+    ranked = scored.assign(rank_market=rank_market, rank_industry=rank_industry)
+    ranked = ranked[(ranked["rank_market"] > 0) | (ranked["rank_industry"] > 0)]
+    # 入選筆數很少，最後的排序成本可忽略
+    ranked = ranked.sort_values(["market", "score"], ascending=[True, False])
+    return ranked[[col for col in RANK_COLUMNS if col in ranked.columns]].reset_index(drop=True)
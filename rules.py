@@ -0,0 +1,261 @@
+"""Declarative screening rules evaluated over wide (date x ticker) panels.
+
+A rule is a JSON object::
+
+    {"name": "kd_low", "window": "screen", "context_bars": 0,
+     "when": {"all": [{"col": "K", "op": "<=", "value": 20},
+                      {"col": "D", "op": "<=", "value": 20}]}}
+
+Conditions nest with ``all`` / ``any`` / ``not``. A predicate compares a column
+with a constant (``value``) or with another column (``ref``), optionally shifted
+back ``shift`` bars and scaled by ``mult``: ``{"col": "Volume", "op": ">",
+"ref": "Volume", "shift": 1, "mult": 3}`` means today's volume is more than three
+times yesterday's.
+
+``RuleEngine`` evaluates predicates only on the candidates still alive. In an
+``all`` group, the predicate that removes the most rows per unit of measured
+cost runs first. Predicate results are cached per panel, so rules that share a
+condition evaluate it once.
+"""
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+OPS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+WINDOWS = ("all", "screen", "last")
+
+# 尚未量測過的條件，假設通過率一半、每筆成本相同
+DEFAULT_PASS_RATE = 0.5
+DEFAULT_COST = 1e-8
+
+
+def validate(rule: Dict) -> Dict:
+    """Check a rule spec and fill in defaults. Raises ValueError on a malformed rule."""
+    if not rule.get("name"):
+        raise ValueError(f"Rule needs a name: {rule}")
+    if rule.get("window", "screen") not in WINDOWS:
+        raise ValueError(f"Rule {rule['name']}: window must be one of {WINDOWS}")
+    if "when" not in rule:
+        raise ValueError(f"Rule {rule['name']} has no 'when' condition")
+    _validate_condition(rule["when"], rule["name"])
+    return {"window": "screen", "context_bars": 0, **rule}
+
+
+def _validate_condition(cond: Dict, name: str) -> None:
+    if "all" in cond or "any" in cond:
+        children = cond.get("all", cond.get("any"))
+        if not isinstance(children, list) or not children:
+            raise ValueError(f"Rule {name}: 'all' / 'any' need a non-empty list")
+        for child in children:
+            _validate_condition(child, name)
+    elif "not" in cond:
+        _validate_condition(cond["not"], name)
+    else:
+        if "col" not in cond or cond.get("op") not in OPS:
+            raise ValueError(f"Rule {name}: predicate needs 'col' and an op in {list(OPS)}: {cond}")
+        if ("value" in cond) == ("ref" in cond):
+            raise ValueError(f"Rule {name}: predicate needs exactly one of 'value' or 'ref': {cond}")
+        shift = cond.get("shift", 0)
+        if isinstance(shift, bool) or not isinstance(shift, int) or shift < 0:
+            raise ValueError(f"Rule {name}: 'shift' must be a non-negative integer (bars back): {cond}")
+
+
+def load_rules(path: str) -> List[Dict]:
+    """Rules from a JSON file holding a list of rule objects"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [validate(rule) for rule in json.load(f)]
+
+
+def _key(pred: Dict) -> Tuple:
+    """Canonical predicate key, shared by every rule that uses the same condition"""
+    return (pred["col"], pred["op"], pred.get("value"), pred.get("ref"),
+            int(pred.get("shift", 0)), float(pred.get("mult", 1.0)))
+
+
+def _predicates(cond: Dict) -> Iterable[Dict]:
+    if "all" in cond or "any" in cond:
+        for child in cond.get("all", cond.get("any")):
+            yield from _predicates(child)
+    elif "not" in cond:
+        yield from _predicates(cond["not"])
+    else:
+        yield cond
+
+
+class _MaskCache:
+    """Per-panel predicate results, filled lazily for the positions actually evaluated"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.done: Dict[Tuple, np.ndarray] = {}
+        self.result: Dict[Tuple, np.ndarray] = {}
+
+    def split(self, key: Tuple, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions already evaluated, positions still to evaluate)"""
+        if key not in self.done:
+            self.done[key] = np.zeros(self.size, dtype=bool)
+            self.result[key] = np.zeros(self.size, dtype=bool)
+            return positions[:0], positions
+        known = self.done[key][positions]
+        return positions[known], positions[~known]
+
+    def store(self, key: Tuple, positions: np.ndarray, passed: np.ndarray) -> None:
+        self.done[key][positions] = True
+        self.result[key][positions] = passed
+
+
+class RuleEngine:
+    """Evaluates a set of rules over one panel at a time.
+
+    Pass rate and cost per row are measured for every predicate and kept across
+    panels, so the ordering adapts to the data as batches go by.
+    """
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = [validate(rule) for rule in rules]
+        names = [rule["name"] for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate rule names: {names}")
+        # {predicate key: [evaluated rows, passed rows, seconds]}
+        self.stats: Dict[Tuple, List[float]] = {}
+        self.columns_needed = sorted({
+            col for rule in self.rules for pred in _predicates(rule["when"])
+            for col in (pred["col"], pred.get("ref")) if col
+        })
+
+    # -- statistics ---------------------------------------------------------
+
+    def _pass_rate(self, key: Tuple) -> float:
+        evaluated, passed, _ = self.stats.get(key, (0, 0, 0.0))
+        return passed / evaluated if evaluated else DEFAULT_PASS_RATE
+
+    def _cost(self, key: Tuple) -> float:
+        evaluated, _, seconds = self.stats.get(key, (0, 0, 0.0))
+        return seconds / evaluated if evaluated else DEFAULT_COST
+
+    def _order(self, children: List[Dict], mode: str) -> List[Dict]:
+        """all: most rows removed per unit cost first; any: most rows accepted per unit cost first"""
+        def rank(cond):
+            keys = [_key(pred) for pred in _predicates(cond)]
+            cost = sum(self._cost(key) for key in keys)
+            rate = float(np.prod([self._pass_rate(key) for key in keys]))
+            if "not" in cond:
+                rate = 1.0 - rate
+            useful = (1.0 - rate) if mode == "all" else rate
+            return cost / max(useful, 1e-6)
+        return sorted(children, key=rank)
+
+    # -- evaluation ---------------------------------------------------------
+
+    def _predicate(self, pred: Dict, values: Dict[str, np.ndarray], n_cols: int,
+                   positions: np.ndarray, cache: _MaskCache) -> np.ndarray:
+        key = _key(pred)
+        _, todo = cache.split(key, positions)
+        if len(todo):
+            started = time.perf_counter()
+            left = values[pred["col"]][todo]
+            if "ref" in pred:
+                shift = int(pred.get("shift", 0))
+                source = todo - shift * n_cols
+                valid = source >= 0
+                right = np.full(len(todo), np.nan)
+                right[valid] = values[pred["ref"]][source[valid]]
+                right = right * float(pred.get("mult", 1.0))
+            else:
+                right = float(pred["value"])
+            with np.errstate(invalid="ignore"):
+                passed = OPS[pred["op"]](left, right)
+            cache.store(key, todo, passed)
+            stat = self.stats.setdefault(key, [0, 0, 0.0])
+            stat[0] += len(todo)
+            stat[1] += int(passed.sum())
+            stat[2] += time.perf_counter() - started
+        return positions[cache.result[key][positions]]
+
+    def _condition(self, cond: Dict, values: Dict[str, np.ndarray], n_cols: int,
+                   positions: np.ndarray, cache: _MaskCache) -> np.ndarray:
+        """Positions (subset of `positions`) where cond holds"""
+        if len(positions) == 0:
+            return positions
+        if "all" in cond:
+            for child in self._order(cond["all"], "all"):
+                positions = self._condition(child, values, n_cols, positions, cache)
+                if len(positions) == 0:
+                    break
+            return positions
+        if "any" in cond:
+            remaining = positions
+            matched = []
+            for child in self._order(cond["any"], "any"):
+                hit = self._condition(child, values, n_cols, remaining, cache)
+                matched.append(hit)
+                remaining = np.setdiff1d(remaining, hit, assume_unique=True)
+                if len(remaining) == 0:
+                    break
+            return np.sort(np.concatenate(matched))
+        if "not" in cond:
+            hit = self._condition(cond["not"], values, n_cols, positions, cache)
+            return np.setdiff1d(positions, hit, assume_unique=True)
+        return self._predicate(cond, values, n_cols, positions, cache)
+
+    def evaluate(self, columns: Dict[str, pd.DataFrame],
+                 windows: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Run every rule over {column: date x ticker} frames sharing index and columns.
+
+        windows maps a window name to a boolean mask over the dates; "all" and "last"
+        are provided automatically. Returns {rule name: (row positions, column positions)},
+        ordered by ticker then date, including `context_bars` bars before each hit.
+        """
+        first = next(iter(columns.values()))
+        n_rows, n_cols = first.shape
+        missing = [col for col in self.columns_needed if col not in columns]
+        if missing:
+            raise ValueError(f"Rules need columns that are not available: {missing}")
+        values = {col: columns[col].to_numpy(dtype=float).ravel() for col in self.columns_needed}
+
+        row_masks = {"all": np.ones(n_rows, dtype=bool), "last": np.arange(n_rows) == n_rows - 1,
+                     **(windows or {})}
+        cache = _MaskCache(n_rows * n_cols)
+        results = {}
+        for rule in self.rules:
+            if rule["window"] not in row_masks:
+                raise ValueError(f"Rule {rule['name']}: no '{rule['window']}' window was given")
+            rows = np.flatnonzero(row_masks[rule["window"]])
+            candidates = (rows[:, None] * n_cols + np.arange(n_cols)).ravel()
+            hits = self._condition(rule["when"], values, n_cols, candidates, cache)
+
+            context = int(rule.get("context_bars", 0))
+            if context and len(hits):
+                extra = [hits - back * n_cols for back in range(1, context + 1)]
+                hits = np.unique(np.concatenate([hits] + [pos[pos >= 0] for pos in extra]))
+            row_pos, col_pos = np.divmod(hits, n_cols)
+            order = np.lexsort((row_pos, col_pos))
+            results[rule["name"]] = (row_pos[order], col_pos[order])
+        return results
+
+    def describe(self) -> List[Dict]:
+        """Measured pass rate and cost per predicate, for logging"""
+        return [
+            {"predicate": key, "evaluated": int(evaluated), "pass_rate": round(passed / evaluated, 4),
+             "ns_per_row": round(seconds / evaluated * 1e9, 2)}
+            for key, (evaluated, passed, seconds) in self.stats.items() if evaluated
+        ]
+
+
+def evaluate_frame(df: pd.DataFrame, rule: Dict) -> np.ndarray:
+    """Boolean row mask of one rule over a single-stock frame (window is ignored)"""
+    engine = RuleEngine([{**rule, "window": "all", "context_bars": 0}])
+    row_pos, _ = engine.evaluate({col: df[[col]] for col in engine.columns_needed})[rule["name"]]
+    mask = np.zeros(len(df), dtype=bool)
+    mask[row_pos] = True
+    return mask
@@ -0,0 +1,245 @@
+"""
+常駐排程服務，取代每次由 cron 冷啟動的執行方式
+"""
+import sys
+import os
+import datetime
+import json
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import listing_store
+import transfer_data
+import update_listings
+from yahooBot import Config, StockAnalyzer, load_config
+
+
+HEARTBEAT_INTERVAL = 30  # 秒
+HEALTH_MAX_AGE = 5 * 60  # 心跳超過此秒數視為不健康
+
+
+@dataclass
+class Job:
+    """排程工作"""
+    name: str
+    at: str
+    weekdays: List[int]
+    func: Callable[[], None]
+    trading_days_only: bool = False
+    last_run: Optional[str] = None
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    last_duration: Optional[float] = None
+    next_run: Optional[datetime.datetime] = field(default=None, repr=False)
+
+    def compute_next_run(self, now: datetime.datetime, calendar=None) -> datetime.datetime:
+        """計算下一次執行時間，trading_days_only 時跳過休市日"""
+        hour, minute = (int(part) for part in self.at.split(":"))
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= now:
+            candidate += datetime.timedelta(days=1)
+        while candidate.weekday() not in self.weekdays or (
+            self.trading_days_only and calendar is not None and not calendar.is_trading_day(candidate.date())
+        ):
+            candidate += datetime.timedelta(days=1)
+        return candidate
+
+
+class Scheduler:
+    """常駐排程器，工作之間共用同一個 StockAnalyzer 與其快取"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.analyzer = StockAnalyzer(config)
+        self.log = self.analyzer.log
+        self.status_file = Path(config.STATUS_FILE)
+        self.started_at = datetime.datetime.now()
+        self.running = True
+        self.running_job: Optional[str] = None
+        self.running_since: Optional[datetime.datetime] = None
+        self._status_lock = threading.Lock()
+        self.jobs = self._build_jobs()
+
+    def _build_jobs(self) -> List[Job]:
+        """依設定建立排程工作"""
+        actions = {
+            "update_listings": self.job_update_listings,
+            "build_universe": self.job_build_universe,
+            "run_analysis": self.analyzer.run_analysis,
+            "run_followup": self.analyzer.run_followup,
+        }
+        jobs = []
+        for name, spec in self.config.SCHEDULE.items():
+            if name not in actions:
+                self.log.warning("Unknown scheduled job %s, skipped", name)
+                continue
+            jobs.append(Job(
+                name=name,
+                at=spec["at"],
+                weekdays=list(spec["weekdays"]),
+                func=actions[name],
+                trading_days_only=spec.get("trading_days_only", False),
+            ))
+        return jobs
+
+    def job_update_listings(self) -> None:
+        """更新上市櫃公司清單"""
+        update_listings.main(data_dir=self.config.LISTING_DIR)
+
+    def job_build_universe(self) -> None:
+        """由快照庫中最新的上市櫃清單重建 _stock.csv"""
+        data_dir = Path(update_listings.resolve_data_dir(self.config.LISTING_DIR))
+        store = listing_store.ListingStore(str(data_dir / "listings.db"))
+        try:
+            twse_file = str(data_dir / "twse_latest.csv")
+            tpex_file = str(data_dir / "tpex_latest.csv")
+            if not store.export_csv("TW", twse_file) or not store.export_csv("TWO", tpex_file):
+                raise FileNotFoundError(f"No listings found in {data_dir / 'listings.db'}")
+        finally:
+            store.close()
+        count = transfer_data.build_universe(
+            twse_file,
+            tpex_file,
+            industries=self.config.UNIVERSE_FILTER.get("industries") or None,
+            stock_file=self.config.STOCK_FILE,
+        )
+        if count == 0:
+            raise RuntimeError("Universe build produced no stocks")
+
+    def _heartbeat(self, done: threading.Event) -> None:
+        """工作執行期間持續更新心跳，避免長時間工作被判定為不健康"""
+        while not done.wait(HEARTBEAT_INTERVAL):
+            self.write_status()
+
+    def run_job(self, job: Job) -> None:
+        """執行單一工作並記錄狀態"""
+        self.log.info("Running scheduled job %s", job.name)
+        start_time = time.time()
+        job.last_run = datetime.datetime.now().isoformat(timespec="seconds")
+        self.running_job, self.running_since = job.name, datetime.datetime.now()
+        self.write_status()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(done,), name="heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            job.func()
+            job.last_status = "ok"
+            job.last_error = None
+        except Exception as e:
+            job.last_status = "failed"
+            job.last_error = str(e)
+            self.log.exception("Scheduled job %s failed: %s", job.name, e)
+        finally:
+            done.set()
+            heartbeat.join()
+            self.running_job, self.running_since = None, None
+        job.last_duration = round(time.time() - start_time, 2)
+        self.log.info("Job %s finished (%s) in %.2f seconds", job.name, job.last_status, job.last_duration)
+
+    def write_status(self) -> None:
+        """寫出健康檢查與最後執行狀態"""
+        status = {
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "heartbeat": datetime.datetime.now().isoformat(timespec="seconds"),
+            "running_job": self.running_job,
+            "running_since": self.running_since.isoformat(timespec="seconds") if self.running_since else None,
+            "jobs": {
+                job.name: {
+                    "at": job.at,
+                    "weekdays": job.weekdays,
+                    "trading_days_only": job.trading_days_only,
+                    "last_run": job.last_run,
+                    "last_status": job.last_status,
+                    "last_error": job.last_error,
+                    "last_duration": job.last_duration,
+                    "next_run": job.next_run.isoformat(timespec="seconds") if job.next_run else None,
+                }
+                for job in self.jobs
+            },
+        }
+        tmp_file = self.status_file.with_suffix(".tmp")
+        # 心跳執行緒與主迴圈共用同一個暫存檔
+        with self._status_lock:
+            try:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(status, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_file, self.status_file)
+            except OSError as e:
+                self.log.error("Failed to write status file %s: %s", self.status_file, e)
+
+    def stop(self, *_args) -> None:
+        """收到終止訊號時結束主迴圈"""
+        self.log.info("Scheduler stopping...")
+        self.running = False
+
+    def run_forever(self) -> None:
+        """主迴圈"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        now = datetime.datetime.now()
+        for job in self.jobs:
+            job.next_run = job.compute_next_run(now, self.analyzer.get_calendar())
+            self.log.info("Job %s scheduled at %s", job.name, job.next_run)
+
+        while self.running:
+            now = datetime.datetime.now()
+            for job in self.jobs:
+                if job.next_run and job.next_run <= now:
+                    self.run_job(job)
+                    job.next_run = job.compute_next_run(datetime.datetime.now(), self.analyzer.get_calendar())
+                    self.log.info("Job %s next run at %s", job.name, job.next_run)
+            self.write_status()
+
+            next_due = min((job.next_run for job in self.jobs if job.next_run), default=None)
+            wait = HEARTBEAT_INTERVAL
+            if next_due:
+                wait = max(0.0, min(wait, (next_due - datetime.datetime.now()).total_seconds()))
+            time.sleep(wait)
+
+        self.write_status()
+
+
+def check_health(status_file: str) -> bool:
+    """檢查狀態檔心跳是否在時限內"""
+    try:
+        with open(status_file, "r", encoding="utf-8") as f:
+            status = json.load(f)
+        heartbeat = datetime.datetime.fromisoformat(status["heartbeat"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Unhealthy: {e}")
+        return False
+
+    age = (datetime.datetime.now() - heartbeat).total_seconds()
+    if age > HEALTH_MAX_AGE:
+        print(f"Unhealthy: last heartbeat {age:.0f} seconds ago")
+        return False
+    print(json.dumps(status, indent=4, ensure_ascii=False))
+    return True
+
+
+def main():
+    """主函數"""
+    config = load_config()
+
+    if "--health" in sys.argv:
+        sys.exit(0 if check_health(config.STATUS_FILE) else 1)
+
+    scheduler = Scheduler(config)
+    if "--run-now" in sys.argv:
+        # 立即依序執行所有工作一次，方便手動驗證
+        for job in scheduler.jobs:
+            scheduler.run_job(job)
+        scheduler.write_status()
+        return
+
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Append-only SQLite store of KD / potential-star signal history (peewee)"""
+import sys
+import argparse
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from peewee import (
+    CharField,
+    DateField,
+    FloatField,
+    Model,
+    SqliteDatabase,
+    chunked,
+    fn,
+)
+
+import trading_calendar
+
+db = SqliteDatabase(None)
+
+INSERT_CHUNK_SIZE = 500
+KINDS = ("kd", "star")
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class Signal(BaseModel):
+    """One signal row. Every run appends its rows; a bar seen by several runs appears once per run."""
+    # 執行時間戳記，同一天重跑也是不同的執行
+    run_id = CharField()
+    run_date = DateField()
+    kind = CharField()
+    date = DateField()
+    ticker = CharField()
+    name = CharField(null=True)
+    industry = CharField(null=True)
+    close = FloatField(null=True)
+    k = FloatField(null=True)
+    d = FloatField(null=True)
+    volume = FloatField(null=True)
+    vol_ratio = FloatField(null=True)
+
+    class Meta:
+        table_name = "signal"
+        indexes = (
+            (("date",), False),
+            (("ticker", "date"), False),
+            (("industry", "date"), False),
+            (("run_id", "kind", "ticker", "date"), True),
+        )
+
+
+# 報表欄位與資料表欄位對照
+COLUMN_MAP = {
+    "id": "ticker",
+    "name": "name",
+    "industry": "industry",
+    "Close": "close",
+    "K": "k",
+    "D": "d",
+    "Volume": "volume",
+    "vol_ratio": "vol_ratio",
+}
+
+
+def _clean(value):
+    """NaN -> None so SQLite stores NULL"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def _strip_suffix(ticker: str) -> str:
+    return ticker.rsplit(".", 1)[0] if ticker.endswith((".TW", ".TWO")) else ticker
+
+
+class SignalStore:
+    """Signal history database"""
+
+    def __init__(self, path: str = "signals.db"):
+        db.init(path, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+        db.connect(reuse_if_open=True)
+        self._migrate()
+        db.create_tables([Signal])
+
+    @staticmethod
+    def _migrate() -> None:
+        """舊版資料表只以 run_date 區分執行：補上 run_id（沿用 run_date）並移除舊的唯一索引"""
+        if not Signal.table_exists():
+            return
+        if "run_id" not in {column.name for column in db.get_columns(Signal._meta.table_name)}:
+            with db.atomic():
+                db.execute_sql('ALTER TABLE "signal" ADD COLUMN "run_id" VARCHAR(255) NOT NULL DEFAULT \'\'')
+                db.execute_sql('UPDATE "signal" SET "run_id" = "run_date"')
+                db.execute_sql('DROP INDEX IF EXISTS "signal_run_date_kind_ticker_date"')
+
+    def close(self) -> None:
+        if not db.is_closed():
+            db.close()
+
+    def _rows(self, kind: str, df: pd.DataFrame, run_date: datetime.date, run_id: str) -> List[dict]:
+        rows = []
+        if df is None or df.empty:
+            return rows
+        dates = pd.to_datetime(df.index).date
+        for bar_date, record in zip(dates, df.to_dict("records")):
+            row = {"run_id": run_id, "run_date": run_date, "kind": kind, "date": bar_date}
+            for column, field_name in COLUMN_MAP.items():
+                if column in record:
+                    row[field_name] = _clean(record[column])
+            row["ticker"] = _strip_suffix(str(row["ticker"]))
+            rows.append(row)
+        return rows
+
+    def append_run(self, kd_df: pd.DataFrame, stars_df: pd.DataFrame,
+                   run_date: Optional[datetime.date] = None, run_id: Optional[str] = None) -> int:
+        """Bulk-insert one run's KD and star rows in a single transaction. Returns rows inserted.
+
+        run_id identifies the run (default: the current timestamp), so a rerun on the same
+        day is stored as a new run instead of being merged into the earlier one.
+        """
+        run_date = run_date or datetime.date.today()
+        run_id = run_id or datetime.datetime.now().isoformat(timespec="microseconds")
+        rows = self._rows("kd", kd_df, run_date, run_id) + self._rows("star", stars_df, run_date, run_id)
+        with db.atomic():
+            for batch in chunked(rows, INSERT_CHUNK_SIZE):
+                Signal.insert_many(batch).on_conflict_ignore().execute()
+        return len(rows)
+
+    def latest_run_date(self, kind: Optional[str] = None) -> Optional[datetime.date]:
+        query = Signal.select(fn.MAX(Signal.run_date))
+        if kind:
+            query = query.where(Signal.kind == kind)
+        return query.scalar()
+
+    def latest_run_id(self, kind: Optional[str] = None) -> Optional[str]:
+        query = Signal.select(fn.MAX(Signal.run_id))
+        if kind:
+            query = query.where(Signal.kind == kind)
+        return query.scalar()
+
+    def latest_run(self, kind: str) -> pd.DataFrame:
+        """Rows of the most recent run, in report layout (date index, report column names)"""
+        run_id = self.latest_run_id(kind)
+        if run_id is None:
+            return pd.DataFrame()
+        query = (Signal
+                 .select()
+                 .where((Signal.kind == kind) & (Signal.run_id == run_id))
+                 .order_by(Signal.ticker, Signal.date))
+        return self._to_frame(query)
+
+    def history(self, ticker: str, kind: str = "kd", start: Optional[datetime.date] = None,
+                end: Optional[datetime.date] = None) -> pd.DataFrame:
+        """Distinct signal bars for one ticker (latest run wins for each bar)"""
+        query = (Signal
+                 .select()
+                 .where((Signal.ticker == _strip_suffix(ticker)) & (Signal.kind == kind)))
+        if start:
+            query = query.where(Signal.date >= start)
+        if end:
+            query = query.where(Signal.date <= end)
+        df = self._to_frame(query.order_by(Signal.date, Signal.run_id))
+        if df.empty:
+            return df
+        return df[~df.index.duplicated(keep="last")]
+
+    def count_hits(self, ticker: str, kind: str = "kd", start: Optional[datetime.date] = None,
+                   end: Optional[datetime.date] = None) -> int:
+        """Number of distinct bars on which the ticker produced a signal"""
+        query = (Signal
+                 .select(fn.COUNT(Signal.date.distinct()))
+                 .where((Signal.ticker == _strip_suffix(ticker)) & (Signal.kind == kind)))
+        if start:
+            query = query.where(Signal.date >= start)
+        if end:
+            query = query.where(Signal.date <= end)
+        return query.scalar() or 0
+
+    def hit_counts(self, start: datetime.date, end: Optional[datetime.date] = None,
+                   kind: Optional[str] = None) -> Dict[str, int]:
+        """Distinct signal bars per ticker since `start` (tickers without the exchange suffix)"""
+        query = (Signal
+                 .select(Signal.ticker, fn.COUNT(Signal.date.distinct()).alias("hits"))
+                 .where(Signal.date >= start))
+        if end:
+            query = query.where(Signal.date <= end)
+        if kind:
+            query = query.where(Signal.kind == kind)
+        return {row.ticker: row.hits for row in query.group_by(Signal.ticker)}
+
+    def signals_on(self, date: datetime.date, kind: str = "kd", industry: Optional[str] = None) -> pd.DataFrame:
+        """All tickers with a signal on one bar date"""
+        query = Signal.select().where((Signal.date == date) & (Signal.kind == kind))
+        if industry:
+            query = query.where(Signal.industry == industry)
+        df = self._to_frame(query.order_by(Signal.ticker, Signal.run_id))
+        if df.empty:
+            return df
+        return df.drop_duplicates(subset=["id"], keep="last")
+
+    def streaks(self, ticker: str, calendar: trading_calendar.TradingCalendar, kind: str = "kd",
+                start: Optional[datetime.date] = None,
+                end: Optional[datetime.date] = None) -> List[Tuple[datetime.date, datetime.date, int]]:
+        """Runs of consecutive trading sessions with a signal: [(first, last, length), ...]"""
+        query = (Signal
+                 .select(Signal.date)
+                 .distinct()
+                 .where((Signal.ticker == _strip_suffix(ticker)) & (Signal.kind == kind)))
+        if start:
+            query = query.where(Signal.date >= start)
+        if end:
+            query = query.where(Signal.date <= end)
+        dates = sorted(row.date for row in query)
+        if not dates:
+            return []
+
+        sessions = calendar.sessions(dates[0], dates[-1])
+        position = {day: i for i, day in enumerate(sessions)}
+        result = []
+        first = prev = dates[0]
+        for day in dates[1:]:
+            if day in position and prev in position and position[day] == position[prev] + 1:
+                prev = day
+                continue
+            result.append((first, prev, self._length(position, first, prev)))
+            first = prev = day
+        result.append((first, prev, self._length(position, first, prev)))
+        return result
+
+    @staticmethod
+    def _length(position, first, last) -> int:
+        if first in position and last in position:
+            return position[last] - position[first] + 1
+        return 1
+
+    @staticmethod
+    def _to_frame(query) -> pd.DataFrame:
+        records = list(query.dicts())
+        if not records:
+            return pd.DataFrame()
+        df = pd.DataFrame.from_records(records).drop(columns=["id", "run_id"])
+        df = df.rename(columns={field_name: column for column, field_name in COLUMN_MAP.items()})
+        df.index = pd.to_datetime(df.pop("date"))
+        df.index.name = "Date"
+        return df[["run_date", "kind"] + list(COLUMN_MAP)]
+
+
+def _parse_date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def main():
+    """Query signal history from the command line"""
+    parser = argparse.ArgumentParser(description="Query KD / star signal history")
+    parser.add_argument("command", choices=["history", "count", "streaks", "on"])
+    parser.add_argument("target", help="ticker (history/count/streaks) or date (on)")
+    parser.add_argument("--kind", default="kd", choices=KINDS)
+    parser.add_argument("--start", type=_parse_date)
+    parser.add_argument("--end", type=_parse_date)
+    parser.add_argument("--industry")
+    parser.add_argument("--db", default="signals.db")
+    parser.add_argument("--holidays", default="twse_holidays.csv")
+    args = parser.parse_args()
+
+    store = SignalStore(args.db)
+    if args.command == "history":
+        print(store.history(args.target, args.kind, args.start, args.end).to_string())
+    elif args.command == "count":
+        print(store.count_hits(args.target, args.kind, args.start, args.end))
+    elif args.command == "streaks":
+        calendar = trading_calendar.load_calendar(args.holidays)
+        for first, last, length in store.streaks(args.target, calendar, args.kind, args.start, args.end):
+            print(f"{first} ~ {last}: {length}")
+    else:
+        print(store.signals_on(_parse_date(args.target), args.kind, args.industry).to_string())
+    store.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
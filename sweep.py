@@ -0,0 +1,55 @@
+"""Evaluate many KD / potential-star threshold sets against one in-memory panel"""
+import itertools
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+GRID_KEYS = ("k_num", "d_num", "days_in_advance", "multiple")
+
+
+def expand_grid(grid: Union[Dict[str, Sequence], List[Dict]]) -> pd.DataFrame:
+    """{key: [values]} -> cartesian product; a list of dicts is used as-is"""
+    if isinstance(grid, dict):
+        values = [list(grid[key]) for key in GRID_KEYS]
+        combos = pd.DataFrame(list(itertools.product(*values)), columns=list(GRID_KEYS))
+    else:
+        combos = pd.DataFrame(list(grid), columns=list(GRID_KEYS))
+    if combos.isna().any().any():
+        raise ValueError(f"Every combination needs {GRID_KEYS}")
+    return combos
+
+
+def evaluate(combos: pd.DataFrame, k: pd.DataFrame, d: pd.DataFrame, close: pd.DataFrame,
+             volume: pd.DataFrame, window_starts: Dict[int, pd.Timestamp]) -> pd.DataFrame:
+    """Count matches per combination with broadcast masks.
+
+    k, d, close, volume are date x ticker frames sharing index/columns.
+    window_starts maps days_in_advance to the first date inside that window.
+    """
+    k_values = k.to_numpy()
+    d_values = d.to_numpy()
+    dates = k.index
+
+    k_num = combos["k_num"].to_numpy(dtype=float)[:, None, None]
+    d_num = combos["d_num"].to_numpy(dtype=float)[:, None, None]
+    # 每組參數的篩選區間 (combos x dates)
+    in_window = np.stack([dates >= window_starts[days] for days in combos["days_in_advance"]])
+
+    # NaN 比較結果為 False，不需額外處理
+    kd_hits = (k_values[None] <= k_num) & (d_values[None] <= d_num) & in_window[:, :, None]
+    kd_rows = kd_hits.sum(axis=(1, 2))
+    kd_tickers = kd_hits.any(axis=1)
+
+    # 潛力股：最後一根收盤上漲，且成交量大於前一根 multiple 倍
+    last_close, prev_close = close.to_numpy()[-1], close.to_numpy()[-2]
+    last_volume, prev_volume = volume.to_numpy()[-1], volume.to_numpy()[-2]
+    multiple = combos["multiple"].to_numpy(dtype=float)[:, None]
+    stars = (last_close > prev_close)[None] & (last_volume[None] > prev_volume[None] * multiple)
+
+    summary = combos.copy()
+    summary["kd_rows"] = kd_rows
+    summary["kd_tickers"] = kd_tickers.sum(axis=1)
+    summary["star_tickers"] = stars.sum(axis=1)
+    summary["kd_and_star_tickers"] = (kd_tickers & stars).sum(axis=1)
+    return summary
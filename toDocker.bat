@@ -16,17 +16,35 @@ mkdir "docker"
 :: 3. 複製 a.py 與 b.py 至 "docker" 資料夾
 echo [INFO] Copying files to "docker" folder...
 copy "_stock.csv" "docker\"
+copy "breadth.py" "docker\"
 copy "crontab" "docker\"
+copy "csv_log_config.yaml" "docker\"
 copy "Dockerfile" "docker\"
+copy "data_quality.py" "docker\"
 copy "emailService.py" "docker\"
 copy "gmail_config.yaml" "docker\"
+copy "indicators.py" "docker\"
 copy "kd_tools.py" "docker\"
+copy "listing_store.py" "docker\"
 copy "log_config.yaml" "docker\"
 copy "logger.py" "docker\"
+copy "out_of_core.py" "docker\"
 copy "potential_stars.py" "docker\"
+copy "price_store.py" "docker\"
+copy "priority.py" "docker\"
+copy "query_api.py" "docker\"
+copy "ranking.py" "docker\"
 copy "requirements" "docker\"
+copy "rules.py" "docker\"
 copy "run.sh" "docker\"
+copy "signal_store.py" "docker\"
+copy "scheduler.py" "docker\"
+copy "trading_calendar.py" "docker\"
+copy "sweep.py" "docker\"
 copy "transfer_data.py" "docker\"
+copy "twse_holidays.csv" "docker\"
+copy "update_listings.py" "docker\"
+copy "universe.py" "docker\"
 copy "yahooBot.py" "docker\"
 
 echo [INFO] All tasks completed.
@@ -0,0 +1,72 @@
+"""TWSE trading calendar"""
+import csv
+import datetime
+from pathlib import Path
+from typing import List, Optional, Set
+
+
+class TradingCalendar:
+    """Weekdays minus exchange holidays and ad-hoc closures (e.g. typhoons)."""
+
+    def __init__(self, holidays: Optional[Set[datetime.date]] = None):
+        self.holidays = set(holidays or ())
+
+    @classmethod
+    def from_file(cls, path: str) -> "TradingCalendar":
+        """Load closures from a csv with `date,description` rows. Lines starting with # are ignored."""
+        holidays = set()
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.reader(f):
+                if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                    continue
+                try:
+                    holidays.add(datetime.date.fromisoformat(row[0].strip()))
+                except ValueError:
+                    # header 或格式錯誤的列
+                    continue
+        return cls(holidays)
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        """True if the exchange is open on `day`"""
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        return day.weekday() < 5 and day not in self.holidays
+
+    def last_session(self, day: datetime.date) -> datetime.date:
+        """The latest trading day on or before `day`"""
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        while not self.is_trading_day(day):
+            day -= datetime.timedelta(days=1)
+        return day
+
+    def sessions(self, begin: datetime.date, end: datetime.date) -> List[datetime.date]:
+        """All trading days in [begin, end]"""
+        days = []
+        day = begin
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += datetime.timedelta(days=1)
+        return days
+
+    def sessions_back(self, count: int, end: datetime.date) -> List[datetime.date]:
+        """The last `count` trading days ending on or before `end`, oldest first"""
+        if count <= 0:
+            raise ValueError(f"sessions_back needs a positive count, got {count}")
+        days = []
+        day = self.last_session(end)
+        while len(days) < count:
+            if self.is_trading_day(day):
+                days.append(day)
+            day -= datetime.timedelta(days=1)
+        return days[::-1]
+
+
+def load_calendar(path: str, log=None) -> TradingCalendar:
+    """Load the holiday file, falling back to a weekday-only calendar if it is missing."""
+    if Path(path).exists():
+        return TradingCalendar.from_file(path)
+    if log:
+        log.warning("Holiday file %s not found, using weekdays only", path)
+    return TradingCalendar()
@@ -1,6 +1,7 @@
 """This application transfer data from 公開資訊站"""
 import logger
 import pandas as pd
+from universe import DEFAULT_INDUSTRIES
 
 log = logger.get_log("csv_log_config.yaml")
 
@@ -90,39 +91,42 @@ def transfer_data(
         return None
 
 
-if __name__ == "__main__":
+def build_universe(
+    twse_file: str,
+    tpex_file: str,
+    industries: list = None,
+    stock_file: str = "_stock.csv",
+) -> int:
+    """Build the analyzer stock list from TWSE/TPEX listing files. Returns number of stocks written."""
+    if industries is None:
+        industries = DEFAULT_INDUSTRIES
     fn = lambda x: [",".join(map(lambda item: item, x))]
-    #先處裡上市股票，股票清單為.csv
-    #SAVE_FILE = transfer_tw_stock_data(files,addtional_func=fn)
     file_TW = "stock_TW.csv"
     file_TWO = "stock_TWO.csv"
     #上市
-    stock_list = transfer_data("twse_20250131.csv", save_file=file_TW,addtional_func=fn) # for Yahoo
+    stock_list = transfer_data(twse_file, save_file=file_TW,addtional_func=fn) # for Yahoo
     #Confirm the numbers of transfered data in file. 
     if stock_list:
-        print(f"numbers of stock_list: {len(stock_list)}")
+        log.info("numbers of stock_list: %d", len(stock_list))
+    else:
+        stock_list = []
     
     #再處裡上櫃股票，股票清單為.csm
     stock_TWO_list = transfer_data(
-        "tpex_20250131.csv",
+        tpex_file,
         save_file=file_TWO,
         extension=".TWO",
         addtional_func=fn
     )
     if stock_TWO_list:
-        print(f"numbers of stock_TWO_list: {len(stock_TWO_list)}")
-
-    if stock_TWO_list:
+        log.info("numbers of stock_TWO_list: %d", len(stock_TWO_list))
         stock_list += stock_TWO_list
-        print(f"numbers of stock_list: {len(stock_list)}")
+        log.info("numbers of stock_list: %d", len(stock_list))
     else:
-        print("Failed to transfer data.")
-    
-
-    #export as dataframe
-    # df = pd.DataFrame(stock_list, columns=['code','name','industry'])
+        log.info("Failed to transfer data.")
 
-    # print(df)
+    if not stock_list:
+        return 0
 
     # #最後將他們合而為一
     try:
@@ -133,22 +137,19 @@ if __name__ == "__main__":
 
     except IOError as e:
         log.exception(e)
-    except Exception as e:
-        log.exception(e)
+        return 0
 
     df = pd.read_csv("stock.csv", names=["code", "name", "industry"])
     #filter data
-    filters = ["電子零組件業", "數位雲端", "半導體業", "電子通路業", "電腦及週邊設備業", "其他電子業", "光電業", "電機機械", "資訊服務業", "電器電纜"]
-    df = df[df['industry'].isin(filters)]
-    print(df)
+    df = df[df['industry'].isin(industries)]
     #finally, write to _stock.csv file
-    df.to_csv("_stock.csv", index=False, header=False)
-
-    # #Confirm the numbers of transfered data in file.  
-    # try:
-    #     with open("stock.csv", "r", encoding="utf8") as f:
-    #         string = f.read()
-    #         array = string.split(",")
-    #         print(f"numbers of stock.csv: {len(array)}")
-    # except IOError as e:
-    #     print("stock.csv File not found:")
+    df.to_csv(stock_file, index=False, header=False)
+    log.info("%d stocks written to %s", len(df), stock_file)
+    return len(df)
+
+
+if __name__ == "__main__":
+    #先處裡上市股票，股票清單為.csv
+    #SAVE_FILE = transfer_tw_stock_data(files,addtional_func=fn)
+    count = build_universe("twse_20250131.csv", "tpex_20250131.csv")
+    print(f"numbers of _stock.csv: {count}")
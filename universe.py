@@ -0,0 +1,127 @@
+"""Declarative universe filter, evaluated before any price data is downloaded"""
+import datetime
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_INDUSTRIES = ["電子零組件業", "數位雲端", "半導體業", "電子通路業", "電腦及週邊設備業", "其他電子業", "光電業", "電機機械", "資訊服務業", "電器電纜"]
+
+# 未設定的條件一律不篩選；缺少資料（新股、快照缺漏）的股票保留，下載後再由資料品質檢查處理
+DEFAULT_FILTER = {
+    "industries": [],
+    "exchanges": [],
+    "min_listing_days": 0,
+    "min_paid_in_capital": 0,
+    "min_avg_volume": 0,
+    "min_price": 0,
+    "max_price": 0,
+}
+# 均量與股價統計超過此天數即視為過期，股票保留在範圍內以便重新下載量測
+DEFAULT_STATS_MAX_AGE = 7
+
+
+def _parse_listing_date(value: str) -> Optional[datetime.date]:
+    """上市日期可能是西元 yyyymmdd 或民國 yyymmdd，也可能帶有分隔符號"""
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 7:
+        digits = str(int(digits[:3]) + 1911) + digits[3:]
+    if len(digits) != 8:
+        return None
+    try:
+        return datetime.datetime.strptime(digits, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _parse_number(value: str) -> float:
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return np.nan
+
+
+def load_price_stats(path: str) -> pd.DataFrame:
+    """上次執行留下的每檔均量與收盤價"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=["last_close", "avg_volume", "as_of"])
+    return pd.read_csv(path, index_col="ticker", encoding="utf-8")
+
+
+def save_price_stats(stats: pd.DataFrame, path: str) -> None:
+    """合併本次的統計值後寫回快取檔"""
+    if stats.empty:
+        return
+    existing = load_price_stats(path)
+    existing = existing[~existing.index.isin(stats.index)]
+    merged = pd.concat([existing, stats]) if not existing.empty else stats
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    merged.rename_axis("ticker").to_csv(path, encoding="utf-8")
+
+
+def price_stats_from_panel(panel: Dict[str, pd.DataFrame], window: int) -> pd.DataFrame:
+    """由下載的寬表計算每檔最新收盤價與近 window 日均量"""
+    close = panel["Close"].ffill()
+    stats = pd.DataFrame({
+        "last_close": close.iloc[-1],
+        "avg_volume": panel["Volume"].tail(window).mean(),
+        "as_of": close.index[-1].strftime("%Y-%m-%d"),
+    })
+    return stats.rename_axis("ticker")
+
+
+def apply_filter(tickers_dict: Dict[str, str], spec: Dict, listings: Dict[str, Dict],
+                 price_stats: pd.DataFrame,
+                 today: Optional[datetime.date] = None,
+                 max_stats_age: int = DEFAULT_STATS_MAX_AGE) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Return (tickers that pass, {condition: number of tickers removed by it})
+
+    Price stats older than `max_stats_age` days (by their as_of date) count as missing,
+    so tickers excluded on volume or price are downloaded again and re-measured.
+    """
+    spec = {**DEFAULT_FILTER, **(spec or {})}
+    today = today or datetime.date.today()
+
+    tickers = pd.Index(list(tickers_dict.keys()), name="ticker")
+    codes = tickers.str.replace(r"\.TWO$|\.TW$", "", regex=True)
+    frame = pd.DataFrame({
+        "exchange": np.where(tickers.str.endswith(".TWO"), "TWO", "TW"),
+        "industry": [line.split(",")[2].strip() if line.count(",") >= 2 else "" for line in tickers_dict.values()],
+        "listing_date": pd.to_datetime(
+            [_parse_listing_date(listings.get(code, {}).get("listing_date", "")) for code in codes]
+        ),
+        "capital": [_parse_number(listings.get(code, {}).get("capital", "")) for code in codes],
+    }, index=tickers)
+    stats = price_stats[["last_close", "avg_volume"]]
+    if max_stats_age and "as_of" in price_stats:
+        cutoff = pd.Timestamp(today - datetime.timedelta(days=max_stats_age))
+        stats = stats[pd.to_datetime(price_stats["as_of"], errors="coerce") >= cutoff]
+    frame = frame.join(stats, how="left")
+
+    masks = {}
+    if spec["industries"]:
+        masks["industries"] = frame["industry"].isin(spec["industries"])
+    if spec["exchanges"]:
+        masks["exchanges"] = frame["exchange"].isin(spec["exchanges"])
+    if spec["min_listing_days"]:
+        cutoff = pd.Timestamp(today - datetime.timedelta(days=spec["min_listing_days"]))
+        masks["min_listing_days"] = frame["listing_date"].isna() | (frame["listing_date"] <= cutoff)
+    if spec["min_paid_in_capital"]:
+        masks["min_paid_in_capital"] = frame["capital"].isna() | (frame["capital"] >= spec["min_paid_in_capital"])
+    if spec["min_avg_volume"]:
+        masks["min_avg_volume"] = frame["avg_volume"].isna() | (frame["avg_volume"] >= spec["min_avg_volume"])
+    if spec["min_price"]:
+        masks["min_price"] = frame["last_close"].isna() | (frame["last_close"] >= spec["min_price"])
+    if spec["max_price"]:
+        masks["max_price"] = frame["last_close"].isna() | (frame["last_close"] <= spec["max_price"])
+
+    keep = pd.Series(True, index=tickers)
+    removed = {}
+    for name, mask in masks.items():
+        mask = mask.fillna(True).astype(bool)
+        removed[name] = int((keep & ~mask).sum())
+        keep &= mask
+
+    return {ticker: tickers_dict[ticker] for ticker in tickers[keep.to_numpy()]}, removed
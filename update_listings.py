@@ -1,5 +1,3 @@
-import csv
-import glob
 import json
 import logging
 import os
@@ -8,10 +6,16 @@ import time
 import urllib.request
 from datetime import date
 
+import listing_store
+
 
 TWSE_URL = "https://openapi.twse.com.tw/v1/opendata/t187ap03_L"
 TPEX_URL = "https://www.tpex.org.tw/openapi/v1/mopsfin_t187ap03_O"
 
+# 快照中上市(櫃)日期與實收資本額的欄位位置，見 _build_headers
+LIST_DATE_COL = 14
+CAPITAL_COL = 16
+
 # 重試設定
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # 秒
@@ -70,15 +74,41 @@ def _request_json(url, logger, max_retries=MAX_RETRIES):
                 raise
 
 
-def _latest_header(pattern, fallback, logger):
-    candidates = sorted(glob.glob(pattern))
-    if not candidates:
-        logger.info(f"找不到現有的檔案 ({pattern})，使用預設 header")
+def _latest_header(store, exchange, fallback, logger):
+    header = store.header(exchange)
+    if not header:
+        logger.info(f"快照庫中沒有 {exchange} 的 header，使用預設 header")
         return fallback
-    latest = candidates[-1]
-    logger.info(f"從現有檔案讀取 header: {latest}")
-    with open(latest, "r", encoding="utf-8-sig", newline="") as f:
-        return next(csv.reader(f))
+    logger.info(f"從快照庫讀取 {exchange} header (最新日期 {store.latest_date(exchange)})")
+    return header
+
+
+def resolve_data_dir(data_dir=None):
+    """快照庫目錄（設定中的 LISTING_DIR）；未指定時為程式目錄下的 data，相對路徑以程式目錄為準"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, data_dir or "data")
+
+
+def load_latest_listings(data_dir=None):
+    """讀取快照庫中最新的上市/上櫃資料，回傳 {公司代號: 欄位}，供選股池篩選使用"""
+    data_dir = resolve_data_dir(data_dir)
+    store_path = os.path.join(data_dir, "listings.db")
+    if not os.path.exists(store_path):
+        return {}
+    store = listing_store.ListingStore(store_path)
+    listings = {}
+    for exchange in listing_store.EXCHANGES:
+        header = store.header(exchange) or []
+        if len(header) <= CAPITAL_COL:
+            continue
+        for code, row in store.latest(exchange).items():
+            listings[code] = {
+                "exchange": exchange,
+                "industry": row.get(header[3], ""),
+                "listing_date": row.get(header[LIST_DATE_COL], ""),
+                "capital": row.get(header[CAPITAL_COL], ""),
+            }
+    return listings
 
 
 def _build_headers():
@@ -173,24 +203,20 @@ def _build_headers():
     return h, twse_header, tpex_header
 
 
-def main():
+def main(export_csv=False, data_dir=None):
     logger = _setup_logging()
     logger.info("=" * 60)
     logger.info("開始執行股票資料更新")
     logger.info("=" * 60)
     
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(base_dir, "data")
+    data_dir = resolve_data_dir(data_dir)
     os.makedirs(data_dir, exist_ok=True)
     logger.info(f"資料目錄: {data_dir}")
 
+    store = listing_store.ListingStore(os.path.join(data_dir, "listings.db"))
     header_keys, default_twse, default_tpex = _build_headers()
-    twse_header = _latest_header(
-        os.path.join(data_dir, "twse_*.csv"), default_twse, logger
-    )
-    tpex_header = _latest_header(
-        os.path.join(data_dir, "tpex_*.csv"), default_tpex, logger
-    )
+    twse_header = _latest_header(store, "TW", default_twse, logger)
+    tpex_header = _latest_header(store, "TWO", default_tpex, logger)
 
     logger.info("開始下載 TWSE 資料...")
     twse_data = _request_json(TWSE_URL, logger)
@@ -270,33 +296,29 @@ def main():
         header_keys["url"]: "WebAddress",
     }
 
-    stamp = date.today().strftime("%Y%m%d")
-    twse_out = os.path.join(data_dir, "twse_%s.csv" % stamp)
-    tpex_out = os.path.join(data_dir, "tpex_%s.csv" % stamp)
+    twse_rows = [
+        [row.get(twse_map[col], "") if col in twse_map else "" for col in twse_header]
+        for row in twse_data
+    ]
+    tpex_rows = [
+        [row.get(tpex_map[col], "") if col in tpex_map else "" for col in tpex_header]
+        for row in tpex_data
+    ]
 
-    logger.info(f"開始寫入 TWSE CSV: {twse_out}")
-    with open(twse_out, "w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(twse_header)
-        for row in twse_data:
-            out = []
-            for col in twse_header:
-                key = twse_map.get(col)
-                out.append(row.get(key, "") if key else "")
-            writer.writerow(out)
-    logger.info(f"完成寫入 TWSE: {len(twse_data)} 筆資料")
+    # 只記錄與前一版不同的列，內容相同的日子不會增加資料
+    upserts, deletes = store.ingest("TW", twse_header, twse_rows)
+    logger.info(f"TWSE 快照寫入完成: {len(twse_rows)} 筆資料，異動 {upserts} 筆，下市 {deletes} 筆")
+    upserts, deletes = store.ingest("TWO", tpex_header, tpex_rows)
+    logger.info(f"TPEX 快照寫入完成: {len(tpex_rows)} 筆資料，異動 {upserts} 筆，下櫃 {deletes} 筆")
 
-    logger.info(f"開始寫入 TPEX CSV: {tpex_out}")
-    with open(tpex_out, "w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(tpex_header)
-        for row in tpex_data:
-            out = []
-            for col in tpex_header:
-                key = tpex_map.get(col)
-                out.append(row.get(key, "") if key else "")
-            writer.writerow(out)
-    logger.info(f"完成寫入 TPEX: {len(tpex_data)} 筆資料")
+    if export_csv:
+        stamp = date.today().strftime("%Y%m%d")
+        twse_out = os.path.join(data_dir, "twse_%s.csv" % stamp)
+        tpex_out = os.path.join(data_dir, "tpex_%s.csv" % stamp)
+        store.export_csv("TW", twse_out)
+        store.export_csv("TWO", tpex_out)
+        logger.info(f"已匯出 CSV: {twse_out}, {tpex_out}")
+    store.close()
 
     logger.info("=" * 60)
     logger.info("股票資料更新完成")
@@ -305,7 +327,9 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        # 與分析程式共用 config.json 的 LISTING_DIR
+        from yahooBot import load_config
+        main(export_csv="--export-csv" in sys.argv, data_dir=load_config().LISTING_DIR)
     except Exception as exc:
         logging.error(f"更新失敗: {exc}", exc_info=True)
         sys.exit(1)
\ No newline at end of file
@@ -4,18 +4,42 @@
 import sys
 import datetime
 from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 import json
+import os
 import time
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
 # 自定義模組導入
 import kd_tools as kd
+import indicators
+import data_quality
+import universe
+import sweep
+import ranking
+import breadth
+import rules
+import priority
+import out_of_core
+from price_store import PriceStore
+import update_listings
+import trading_calendar
 import potential_stars as ps
 import logger
 import emailService
+from signal_store import SignalStore
+
+
+REPORT_COLUMNS = ["id", "name", "industry", "Close", "K", "D", "Volume", "vol_ratio"]
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+# 報表必備的指標，其餘可由 config.json 的 INDICATORS 選用
+REQUIRED_INDICATORS = ["KD", "VOL_RATIO"]
+# 內建篩選規則名稱，SCREEN_RULES 不可重複使用；latest 為最新指標報表所用
+BUILTIN_RULES = ("kd_low", "potential_star")
+RESERVED_RULE_NAMES = BUILTIN_RULES + ("latest",)
 
 
 @dataclass
@@ -25,12 +49,60 @@ class Config:
     DEFAULT_DAYS: int = 7
     DATA_PERIOD_DAYS: int = 90
     BATCH_SIZE: int = 1000
+    DEADLINE_BATCH_SIZE: int = 100
     STOCK_FILE: str = "_stock.csv"
     REPORT_DIR: str = "reports"
+    HOLIDAY_FILE: str = "twse_holidays.csv"
+    SIGNAL_DB: str = "signals.db"
+    LISTING_DIR: str = "data"
+    PRICE_STATS_FILE: str = "data/price_stats.csv"
+    PRICE_STATS_WINDOW: int = 20
+    PRICE_STATS_MAX_AGE: int = universe.DEFAULT_STATS_MAX_AGE
+    UNIVERSE_FILTER: Dict = field(default_factory=lambda: {
+        **universe.DEFAULT_FILTER,
+        "industries": list(universe.DEFAULT_INDUSTRIES),
+    })
+    EXPORT_REPORTS: bool = True
     CONFIG_FILE: str = "config.json"
     POTENTIAL_STAR_THRESHOLD: float = 4.2
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 5
+    PRICE_CACHE_TTL: int = 3600
+    VOL_RATIO_WINDOW: int = 5
+    MIN_VALID_BARS: int = 9
+    DQ_DROP_REASONS: List[str] = field(default_factory=lambda: list(data_quality.REASONS))
+    SWEEP_GRID: Dict[str, List] = field(default_factory=lambda: {
+        "k_num": [10, 20, 30],
+        "d_num": [10, 20, 30],
+        "days_in_advance": [3, 5, 7],
+        "multiple": [2.0, 3.0, 4.2],
+    })
+    RANK_TOP_K_MARKET: int = 20
+    RANK_TOP_K_INDUSTRY: int = 5
+    RANK_WEIGHTS: Dict[str, float] = field(default_factory=lambda: dict(ranking.DEFAULT_WEIGHTS))
+    BREADTH_SPIKE_RATIO: float = 2.0
+    SCREEN_RULES: List[Dict] = field(default_factory=list)
+    WATCHLIST: List[str] = field(default_factory=list)
+    PRIORITY_HISTORY_DAYS: int = 20
+    TIME_BUDGET_SECONDS: int = 0
+    DEADLINE: str = ""
+    PARTIAL_DIR: str = "data/partial"
+    PRICE_STORE_DIR: str = "data/prices"
+    PRICE_STORE_UPDATE: bool = False
+    OOC_MEMORY_BUDGET_MB: int = 256
+    OOC_SCAN_DAYS: int = 250
+    OOC_SPILL_DIR: str = "data/ooc"
+    INDICATORS: List[str] = field(default_factory=lambda: ["KD", "VOL_RATIO"])
+    INDICATOR_PARAMS: Dict[str, Dict] = field(default_factory=dict)
+    QUERY_API_HOST: str = "127.0.0.1"
+    QUERY_API_PORT: int = 8013
+    STATUS_FILE: str = "scheduler_status.json"
+    SCHEDULE: Dict[str, Dict] = field(default_factory=lambda: {
+        "update_listings": {"at": "08:30", "weekdays": [0, 1, 2, 3, 4], "trading_days_only": True},
+        "build_universe": {"at": "08:45", "weekdays": [0, 1, 2, 3, 4], "trading_days_only": True},
+        "run_analysis": {"at": "20:00", "weekdays": [1, 4], "trading_days_only": True},
+        "run_followup": {"at": "21:00", "weekdays": [1, 4], "trading_days_only": True},
+    })
 
 
 class StockAnalyzer:
@@ -40,7 +112,60 @@ class StockAnalyzer:
         self.config = config
         self.log = logger.get_log("log_config.yaml")
         self.report_dir = self._setup_report_directory()
+        self.indicator_plan = self._build_indicator_plan()
+        self.rule_engine = self._build_rule_engine()
+        self.report_columns = REPORT_COLUMNS + [
+            col for col in self.indicator_plan.columns if col not in REPORT_COLUMNS
+        ]
+        # 常駐模式下跨工作保留的暖快取
+        self._stock_list_cache: Optional[Tuple[float, Dict[str, str]]] = None
+        self._calendar_cache: Optional[Tuple[float, trading_calendar.TradingCalendar]] = None
+        self._signal_store: Optional[SignalStore] = None
+        self._price_store: Optional[PriceStore] = None
+        self._price_cache: Dict[Tuple[str, ...], Tuple[float, pd.DataFrame]] = {}
+        self._indicator_cache: Dict[Tuple[str, ...], Tuple[float, object, Dict[str, pd.DataFrame]]] = {}
+        # 每支股票最新一筆指標值，供 indicators 報表與查詢服務使用
+        self._indicator_rows: List[pd.DataFrame] = []
+        self.indicators_df = pd.DataFrame()
+        # SCREEN_RULES 自訂規則的結果
+        self._screen_rows: Dict[str, List[pd.DataFrame]] = {}
+        self.screen_results: Dict[str, pd.DataFrame] = {}
+        # 期限與涵蓋率，期限內未完成的股票由補跑處理
+        self._deadline: Optional[float] = None
+        self.coverage: Dict = {}
+        # 排名後的精簡報表
+        self.ranked_df = pd.DataFrame()
+        # 產業廣度：各批次最近幾根K棒，整個股票池處理完後一次彙總
+        self._breadth_parts: List[Dict[str, pd.DataFrame]] = []
+        self.breadth_df = pd.DataFrame()
+        # 資料品質檢查結果
+        self.dq_counts: Dict[str, int] = {}
+        self._dq_flags: List[pd.Series] = []
+        self._price_stats: List[pd.DataFrame] = []
         
+    def _build_indicator_plan(self) -> indicators.IndicatorPlan:
+        """依設定建立指標計畫"""
+        params = {"VOL_RATIO": {"window": self.config.VOL_RATIO_WINDOW}}
+        for name, values in self.config.INDICATOR_PARAMS.items():
+            params[name] = {**params.get(name, {}), **values}
+        plan = indicators.IndicatorPlan(REQUIRED_INDICATORS + list(self.config.INDICATORS), params)
+        self.log.info("Indicator plan: %s (%d shared intermediates)",
+                      [ind.name for ind in plan.indicators], len(plan.intermediates))
+        return plan
+    
+    def _build_rule_engine(self) -> rules.RuleEngine:
+        """內建的KD低檔與潛力股規則，加上 SCREEN_RULES 自訂規則"""
+        reserved = [rule.get("name") for rule in self.config.SCREEN_RULES if rule.get("name") in RESERVED_RULE_NAMES]
+        if reserved:
+            raise ValueError(f"SCREEN_RULES cannot use the reserved rule names {reserved}")
+        screen_rules = [
+            kd.kd_low_rule(self.config.DEFAULT_KD_LIMITS, self.config.DEFAULT_KD_LIMITS, name="kd_low"),
+            ps.star_rule(self.config.POTENTIAL_STAR_THRESHOLD, name="potential_star"),
+        ] + list(self.config.SCREEN_RULES)
+        engine = rules.RuleEngine(screen_rules)
+        self.log.info("Screening rules: %s", [rule["name"] for rule in engine.rules])
+        return engine
+    
     def _setup_report_directory(self) -> Path:
         """設置報告目錄"""
         report_path = Path.cwd() / self.config.REPORT_DIR
@@ -52,6 +177,29 @@ class StockAnalyzer:
             self.log.exception("Failed to create report directory: %s", e)
             raise
     
+    def get_calendar(self) -> trading_calendar.TradingCalendar:
+        """載入交易日曆，休市檔案（如颱風假）更新時自動重新載入"""
+        holiday_file = Path(self.config.HOLIDAY_FILE)
+        mtime = holiday_file.stat().st_mtime if holiday_file.exists() else 0.0
+        if self._calendar_cache is None or self._calendar_cache[0] != mtime:
+            calendar = trading_calendar.load_calendar(str(holiday_file), self.log)
+            self._calendar_cache = (mtime, calendar)
+            self.log.info("Trading calendar loaded with %d closures", len(calendar.holidays))
+        return self._calendar_cache[1]
+    
+    @property
+    def required_bars(self) -> int:
+        """指標暖機與篩選區間合計所需的交易日數"""
+        return self.indicator_plan.warmup + self.config.DEFAULT_DAYS
+    
+    def download_window(self) -> Tuple[str, str]:
+        """依交易日曆計算下載區間 (start, end)，end 不含當日"""
+        calendar = self.get_calendar()
+        today = datetime.date.today()
+        sessions = calendar.sessions_back(self.required_bars, today)
+        end = sessions[-1] + datetime.timedelta(days=1)
+        return sessions[0].strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    
     def load_stock_list(self) -> Dict[str, str]:
         """載入股票清單"""
         stock_file = Path(self.config.STOCK_FILE)
@@ -60,6 +208,11 @@ class StockAnalyzer:
             self.log.error("Stock file %s not found", stock_file)
             raise FileNotFoundError(f"Stock file {stock_file} not found")
         
+        # 股票清單未變更時直接使用快取
+        mtime = stock_file.stat().st_mtime
+        if self._stock_list_cache and self._stock_list_cache[0] == mtime:
+            return self._stock_list_cache[1]
+        
         try:
             with open(stock_file, "r", encoding="utf8") as f:
                 companies = f.readlines()
@@ -74,20 +227,42 @@ class StockAnalyzer:
                         tickers_dict[ticker_id] = company_data
                     
             self.log.info("Loaded %d stocks from %s", len(tickers_dict), stock_file)
+            self._stock_list_cache = (mtime, tickers_dict)
             return tickers_dict
             
         except (IOError, UnicodeDecodeError) as e:
             self.log.exception("Error reading stock file: %s", e)
             raise
     
-    def download_stock_data(self, tickers: List[str], retries: int = 0) -> Optional[pd.DataFrame]:
-        """下載股票數據，支援重試機制"""
+    def select_universe(self, tickers_dict: Dict[str, str]) -> Dict[str, str]:
+        """下載前依 UNIVERSE_FILTER 篩選股票池，不在範圍內的股票不會被下載"""
+        listings = update_listings.load_latest_listings(self.config.LISTING_DIR)
+        price_stats = universe.load_price_stats(self.config.PRICE_STATS_FILE)
+        selected, removed = universe.apply_filter(
+            tickers_dict, self.config.UNIVERSE_FILTER, listings, price_stats,
+            max_stats_age=self.config.PRICE_STATS_MAX_AGE
+        )
+        self.log.info("Universe filter kept %d/%d stocks, removed by condition: %s",
+                      len(selected), len(tickers_dict), removed)
+        return selected
+    
+    def download_stock_data(self, tickers: List[str], retries: int = 0,
+                            window: Optional[Tuple[str, str]] = None) -> Optional[pd.DataFrame]:
+        """下載股票數據，支援重試機制；指定 window 時（歷史回補）不使用快取"""
+        start, end = window or self.download_window()
+        cache_key = tuple(tickers) + (start, end)
+        cached = self._price_cache.get(cache_key)
+        if window is None and cached and time.time() - cached[0] < self.config.PRICE_CACHE_TTL:
+            self.log.info("Using cached data for %d stocks", len(tickers))
+            return cached[1].copy()
+        
         try:
-            self.log.info("Downloading data for %d stocks...", len(tickers))
+            self.log.info("Downloading data for %d stocks (%s ~ %s)...", len(tickers), start, end)
             df = yf.download(
                 tickers, 
                 group_by="ticker", 
-                period="1mo",
+                start=start,
+                end=end,
                 progress=False
             )
             
@@ -96,160 +271,256 @@ class StockAnalyzer:
                 return None
                 
             self.log.info("Stock data downloaded successfully")
-            return df
+            if window is not None:
+                return df
+            self._evict_expired(self._price_cache)
+            self._price_cache[cache_key] = (time.time(), df)
+            return df.copy()
             
         except Exception as e:
             self.log.error("Error downloading stock data (attempt %d): %s", retries + 1, e)
             
-            if retries < self.config.MAX_RETRIES:
+            if retries < self.config.MAX_RETRIES and not self._past_deadline():
                 self.log.info("Retrying in %d seconds...", self.config.RETRY_DELAY)
                 time.sleep(self.config.RETRY_DELAY)
-                return self.download_stock_data(tickers, retries + 1)
+                return self.download_stock_data(tickers, retries + 1, window)
             else:
                 self.log.error("Max retries reached. Download failed.")
                 return None
     
-    def process_batch(self, batch_tickers: List[str], tickers_dict: Dict[str, str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        """處理單一批次的股票數據"""
-        batch_kd_df = pd.DataFrame()
-        batch_stars_df = pd.DataFrame()
-        
-        # 下載批次數據
-        df = self.download_stock_data(batch_tickers)
-        if df is None or df.empty:
-            return batch_kd_df, batch_stars_df
-        
-        # 處理多股票數據格式
-        if len(batch_tickers) == 1:
-            # 單一股票的情況
-            ticker = batch_tickers[0]
-            processed_data = {ticker: df}
+    def build_panel(self, df: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+        """將 yfinance 下載結果轉為 {欄位: 日期 x 股票} 的寬表"""
+        panel = {}
+        if isinstance(df.columns, pd.MultiIndex):
+            # 以欄位名稱定位價格欄所在層級，不依賴欄位順序
+            field_level = next(
+                (level for level in range(df.columns.nlevels)
+                 if "Close" in df.columns.get_level_values(level)),
+                None
+            )
+            available = set(df.columns.get_level_values(field_level)) if field_level is not None else set()
         else:
-            # 多股票的情況
-            processed_data = {idx: gp.T for idx, gp in df.T.groupby(level=0)}
+            available = set(df.columns)
         
-        # 處理每支股票
-        for ticker_id, stock_data in processed_data.items():
-            try:
-                kd_result, stars_result = self._process_single_stock(
-                    ticker_id, stock_data, tickers_dict
-                )
-                
-                if kd_result is not None and not kd_result.empty:
-                    batch_kd_df = pd.concat([batch_kd_df, kd_result], ignore_index=False)
-                
-                if stars_result is not None and not stars_result.empty:
-                    batch_stars_df = pd.concat([batch_stars_df, stars_result], ignore_index=False)
-                    
-            except Exception as e:
-                self.log.error("Error processing stock %s: %s", ticker_id, e)
-                continue
+        missing = [field_name for field_name in PRICE_FIELDS if field_name not in available]
+        if missing:
+            raise ValueError(f"Downloaded data is missing fields {missing}, columns: {list(df.columns)[:10]}")
         
-        return batch_kd_df, batch_stars_df
+        if isinstance(df.columns, pd.MultiIndex):
+            for field_name in PRICE_FIELDS:
+                panel[field_name] = df.xs(field_name, axis=1, level=field_level)
+        else:
+            # 單一股票且未分組的情況
+            for field_name in PRICE_FIELDS:
+                panel[field_name] = df[[field_name]].set_axis([tickers[0]], axis=1)
+        return panel
     
-    def _process_single_stock(self, ticker_id: str, stock_data: pd.DataFrame, 
-                            tickers_dict: Dict[str, str]) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
-        """處理單支股票的數據"""
+    def compute_indicators(self, panel: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """以指標計畫一次計算整批股票的所有指標，最新K棒未變時沿用上次結果"""
+        close = panel["Close"]
+        cache_key = tuple(close.columns)
+        signature = (close.index[-1], len(close), float(close.iloc[-1].sum()))
+        cached = self._indicator_cache.get(cache_key)
+        if cached and cached[1] == signature:
+            return cached[2]
         
-        # 獲取股票基本資訊
-        ticker_info = tickers_dict.get(ticker_id)
-        if not ticker_info:
-            return None, None
+        outputs = self.indicator_plan.run(panel)
+        self._evict_expired(self._indicator_cache)
+        self._indicator_cache[cache_key] = (time.time(), signature, outputs)
+        return outputs
+    
+    def _evict_expired(self, cache: Dict) -> None:
+        """寫入前移除超過 PRICE_CACHE_TTL 的項目；批次組成與下載區間每次執行都會改變，舊項目不會再命中"""
+        now = time.time()
+        for key in [key for key, entry in cache.items() if now - entry[0] >= self.config.PRICE_CACHE_TTL]:
+            del cache[key]
+    
+    def prepare_batch(self, batch_tickers: List[str]) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]]:
+        """下載、檢查並計算單一批次的指標，回傳 (價格寬表, 指標寬表)"""
+        # 下載批次數據
+        df = self.download_stock_data(batch_tickers)
+        if df is None or df.empty:
+            return None
         
-        try:
-            parts = ticker_info.split(',')
-            ticker_name = parts[1] if len(parts) > 1 else "Unknown"
-            ticker_industry = parts[2].replace("\n", "") if len(parts) > 2 else "Unknown"
-        except IndexError:
-            self.log.warning("Invalid ticker info format for %s", ticker_id)
-            return None, None
-        
-        # 標準化欄位名稱
-        if 'Adj Close' in stock_data.columns.get_level_values(1) if hasattr(stock_data.columns, 'get_level_values') else stock_data.columns:
-            stock_data.columns = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
-        else:
-            stock_data.columns = ["Open", "High", "Low", "Close", "Volume"]
+        # 資料品質檢查，只讓能產生訊號的股票進入指標計算
+        panel = self.build_panel(df, batch_tickers)
+        keep, flagged, counts = data_quality.validate_panel(
+            panel, self.config.MIN_VALID_BARS, self.config.DQ_DROP_REASONS,
+            last_session=self.get_calendar().last_session(datetime.date.today()), log=self.log
+        )
+        self._record_quality(flagged, counts)
+        self._price_stats.append(universe.price_stats_from_panel(panel, self.config.PRICE_STATS_WINDOW))
+        if not keep:
+            return None
+        if len(keep) < len(panel["Close"].columns):
+            panel = {name: frame[keep] for name, frame in panel.items()}
+        # 只有通過資料品質檢查的股票寫入價格庫
+        if self.config.PRICE_STORE_UPDATE:
+            self._append_price_store(panel)
         
-        # 添加股票資訊
-        stock_data['id'] = ticker_id
-        stock_data['name'] = ticker_name
-        stock_data['industry'] = ticker_industry
+        # 整批計算指標
+        return panel, self.compute_indicators(panel)
+    
+    def process_batch(self, batch_tickers: List[str], tickers_dict: Dict[str, str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """處理單一批次的股票數據，所有篩選規則一次作用於整批寬表"""
+        prepared = self.prepare_batch(batch_tickers)
+        if prepared is None:
+            return pd.DataFrame(), pd.DataFrame()
+        panel, outputs = prepared
+        columns = {**panel, **outputs}
+        # 保留產業廣度所需的最近K棒（多一根用於計算漲跌）
+        self._breadth_parts.append({
+            name: columns[name].tail(self.config.DEFAULT_DAYS + 1) for name in ("Close", "K", "D", "vol_ratio")
+        })
         
-        # 計算KD指標
-        kd_result = self._calculate_kd_analysis(stock_data)
+        hits = self.rule_engine.evaluate(columns, {"screen": self._screen_window(panel["Close"].index)})
+        batch_kd_df = self._report_rows(columns, *hits.pop("kd_low"), tickers_dict)
+        batch_stars_df = self._report_rows(columns, *hits.pop("potential_star"), tickers_dict)
+        for name, (row_pos, col_pos) in hits.items():
+            screen_df = self._report_rows(columns, row_pos, col_pos, tickers_dict)
+            if not screen_df.empty:
+                self._screen_rows.setdefault(name, []).append(screen_df)
         
-        # 尋找潛在飆股
-        stars_result = self._find_potential_stars(stock_data)
+        # 記錄每支股票最新一筆有效指標值
+        valid = panel["Close"].notna().to_numpy()
+        has_data = valid.any(axis=0)
+        last_pos = len(valid) - 1 - valid[::-1].argmax(axis=0)
+        latest = self._report_rows(columns, last_pos[has_data], np.flatnonzero(has_data), tickers_dict)
+        if not latest.empty:
+            self._indicator_rows.append(latest)
         
-        return kd_result, stars_result
+        return batch_kd_df, batch_stars_df
     
-    def _calculate_kd_analysis(self, stock_data: pd.DataFrame) -> Optional[pd.DataFrame]:
-        """計算KD分析"""
-        try:
-            df_kd = kd.calculate_kd(stock_data)
-            if df_kd is None or df_kd.empty:
-                return None
-            
-            kd_under_level = kd.filter_data_days(
-                df_kd, 
-                days_in_advance=self.config.DEFAULT_DAYS, 
-                d_num=self.config.DEFAULT_KD_LIMITS
-            )
-            
-            return kd_under_level[["id", "name", "industry", "Close", "K", "D", "Volume"]]
-            
-        except Exception as e:
-            self.log.error("Error in KD calculation: %s", e)
-            return None
+    def _screen_window(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """最近 DEFAULT_DAYS 個交易日（含今日）"""
+        today = datetime.date.today()
+        begin = pd.Timestamp(self.get_calendar().sessions_back(max(self.config.DEFAULT_DAYS, 1), today)[0])
+        end = pd.Timestamp(today) + pd.Timedelta(days=1)
+        return np.asarray((dates >= begin) & (dates < end))
     
-    def _find_potential_stars(self, stock_data: pd.DataFrame) -> Optional[pd.DataFrame]:
-        """尋找潛在飆股"""
-        try:
-            recent_data = stock_data.tail(2)
-            if len(recent_data) < 2:
-                return None
-            
-            prev_day_data = recent_data.iloc[0]
-            current_day_data = recent_data.iloc[1]
-            
-            if ps.is_potential_star(
-                prev_day_data, 
-                current_day_data, 
-                self.log, 
-                self.config.POTENTIAL_STAR_THRESHOLD
-            ):
-                return recent_data[["id", "name", "industry", "Close", "K", "D", "Volume"]]
-            
-            return None
-            
-        except Exception as e:
-            self.log.error("Error in potential stars analysis: %s", e)
-            return None
+    def _report_rows(self, columns: Dict[str, pd.DataFrame], row_pos: np.ndarray, col_pos: np.ndarray,
+                     tickers_dict: Dict[str, str]) -> pd.DataFrame:
+        """依 (日期位置, 股票位置) 組出報表格式的資料列，略過股票清單中沒有的股票"""
+        tickers = columns["Close"].columns.to_numpy()
+        known = np.array([tickers_dict.get(ticker_id) is not None for ticker_id in tickers[col_pos]], dtype=bool)
+        row_pos, col_pos = row_pos[known], col_pos[known]
+        if len(row_pos) == 0:
+            return pd.DataFrame()
+        
+        ids = tickers[col_pos]
+        parts = [tickers_dict[ticker_id].split(',') for ticker_id in ids]
+        rows = pd.DataFrame({
+            "id": ids,
+            "name": [info[1] if len(info) > 1 else "Unknown" for info in parts],
+            "industry": [info[2].replace("\n", "") if len(info) > 2 else "Unknown" for info in parts],
+            **{
+                col: columns[col].to_numpy()[row_pos, col_pos]
+                for col in self.report_columns if col in columns
+            },
+        }, index=columns["Close"].index[row_pos])
+        return rows[self.report_columns]
+    
+    def _record_quality(self, flagged: pd.Series, counts: Dict[str, int]) -> None:
+        """累計資料品質檢查結果"""
+        for reason, count in counts.items():
+            self.dq_counts[reason] = self.dq_counts.get(reason, 0) + count
+        if not flagged.empty:
+            self._dq_flags.append(flagged)
+            self.log.info("Data quality flagged %d stocks: %s",
+                          len(flagged), {reason: count for reason, count in counts.items() if count})
     
     def chunks(self, lst: List, n: int):
         """將列表分割成指定大小的批次"""
         for i in range(0, len(lst), n):
             yield lst[i:i + n]
     
-    def analyze_stocks(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        """主要分析函數"""
+    def prioritize(self, tickers_dict: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """掃描順序：觀察名單優先，其餘依流動性與近期訊號次數排序"""
+        price_stats = universe.load_price_stats(self.config.PRICE_STATS_FILE)
+        signal_hits = {}
+        if self.config.PRIORITY_HISTORY_DAYS > 0 and Path(self.config.SIGNAL_DB).exists():
+            try:
+                if self._signal_store is None:
+                    self._signal_store = SignalStore(self.config.SIGNAL_DB)
+                since = self.get_calendar().sessions_back(self.config.PRIORITY_HISTORY_DAYS, datetime.date.today())[0]
+                signal_hits = self._signal_store.hit_counts(since)
+            except Exception as e:
+                self.log.error("Failed to read signal history for prioritization: %s", e)
+        watch, rest = priority.priority_order(
+            list(tickers_dict.keys()), self.config.WATCHLIST, price_stats, signal_hits
+        )
+        self.log.info("Scan order: %d watchlist stocks first, then %d by liquidity and signal history",
+                      len(watch), len(rest))
+        return watch, rest
+    
+    def _deadline_at(self) -> Optional[float]:
+        """TIME_BUDGET_SECONDS 與 DEADLINE（HH:MM）中較早者，皆未設定時為 None"""
+        limits = []
+        if self.config.TIME_BUDGET_SECONDS:
+            limits.append(time.time() + self.config.TIME_BUDGET_SECONDS)
+        if self.config.DEADLINE:
+            hour, minute = (int(part) for part in self.config.DEADLINE.split(":"))
+            limits.append(datetime.datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp())
+        return min(limits) if limits else None
+    
+    def _past_deadline(self) -> bool:
+        return self._deadline is not None and time.time() >= self._deadline
+    
+    def analyze_stocks(self, resume: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """主要分析函數，依優先順序分批處理；到達期限時停止，未完成的股票留待補跑（resume=True）"""
         # 載入股票清單
-        tickers_dict = self.load_stock_list()
-        all_tickers = list(tickers_dict.keys())
+        tickers_dict = self.select_universe(self.load_stock_list())
         
         # 初始化結果DataFrame
         total_kd_df = pd.DataFrame()
         total_stars_df = pd.DataFrame()
+        self._indicator_rows = []
+        self.dq_counts = {reason: 0 for reason in data_quality.REASONS}
+        self._dq_flags = []
+        self._price_stats = []
+        self._breadth_parts = []
+        self._screen_rows = {}
+        
+        if resume:
+            # 補跑：還原前一次部分結果，只處理尚未完成的股票
+            state = self._load_partial()
+            total_kd_df, total_stars_df = state["kd"], state["stars"]
+            watch = []
+            rest = [ticker for ticker in state["pending"] if ticker in tickers_dict]
+            total, done_before = state["total"], state["processed"]
+            watch_total, watch_done_before = state["watchlist_total"], state["watchlist_processed"]
+            self._deadline = None
+        else:
+            watch, rest = self.prioritize(tickers_dict)
+            total, done_before = len(watch) + len(rest), 0
+            watch_total, watch_done_before = len(watch), 0
+            self._deadline = self._deadline_at()
         
-        # 分批處理股票
-        ticker_batches = list(self.chunks(all_tickers, self.config.BATCH_SIZE))
+        # 觀察名單自成第一批，確保最先完成；有期限時改用小批次，才能在期限前停下
+        batch_size = self.config.BATCH_SIZE
+        if self._deadline is not None:
+            batch_size = min(batch_size, self.config.DEADLINE_BATCH_SIZE)
+        ticker_batches = ([watch] if watch else []) + list(self.chunks(rest, batch_size))
+        all_tickers = watch + rest
         
-        self.log.info("Processing %d stocks in %d batches", len(all_tickers), len(ticker_batches))
+        self.log.info("Processing %d stocks in %d batches%s", len(all_tickers), len(ticker_batches),
+                      f", deadline {datetime.datetime.fromtimestamp(self._deadline):%H:%M:%S}" if self._deadline else "")
         
+        done: set = set()
+        batch_seconds: List[float] = []
         for i, batch in enumerate(ticker_batches):
+            # 預估下一批會超過期限時停止（第一批一定執行）
+            if self._deadline is not None and i > 0:
+                expected = sum(batch_seconds) / len(batch_seconds) if batch_seconds else 0.0
+                if time.time() + expected > self._deadline:
+                    self.log.warning("Deadline reached after %d/%d batches, %d stocks left for the follow-up pass",
+                                     i, len(ticker_batches), len(all_tickers) - len(done))
+                    break
+            
             progress = f"[{i+1}/{len(ticker_batches)}]"
             print(f"{progress} Processing batch {i+1} ({len(batch)} stocks)...")
             self.log.info("Processing batch %d/%d (%d stocks)", i+1, len(ticker_batches), len(batch))
+            batch_start = time.time()
             
             try:
                 batch_kd_df, batch_stars_df = self.process_batch(batch, tickers_dict)
@@ -259,17 +530,316 @@ class StockAnalyzer:
                 
                 if not batch_stars_df.empty:
                     total_stars_df = pd.concat([total_stars_df, batch_stars_df], ignore_index=False)
+                done.update(batch)
                 
                 # 批次間暫停，避免API限制
                 if i < len(ticker_batches) - 1:
                     time.sleep(1)
                     
             except Exception as e:
+                # 失敗的批次不計入完成，留待補跑重試
                 self.log.error("Error processing batch %d: %s", i+1, e)
-                continue
+            finally:
+                batch_seconds.append(time.time() - batch_start)
+        
+        pending = [ticker for ticker in all_tickers if ticker not in done]
+        processed = len(all_tickers) - len(pending)
+        watch_done = watch_done_before + sum(ticker in done for ticker in watch)
+        self.coverage = {
+            "run_date": datetime.date.today().isoformat(),
+            "complete": not pending,
+            "followup": resume,
+            "total": total,
+            "processed": done_before + processed,
+            "pending": len(pending),
+            "ratio": round((done_before + processed) / total, 4) if total else 1.0,
+            "watchlist_total": watch_total,
+            "watchlist_processed": watch_done,
+            "deadline": datetime.datetime.fromtimestamp(self._deadline).isoformat(timespec="seconds")
+            if self._deadline else None,
+        }
+        if pending:
+            self._save_partial(pending, total_kd_df, total_stars_df)
+        else:
+            self._clear_partial()
+        
+        if self._indicator_rows:
+            self.indicators_df = pd.concat(self._indicator_rows, ignore_index=False)
+        else:
+            self.indicators_df = pd.DataFrame()
+        self.breadth_df = self.compute_breadth(tickers_dict)
+        self.screen_results = {
+            name: pd.concat(frames, ignore_index=False) for name, frames in self._screen_rows.items()
+        }
+        self.log.debug("Screening predicate statistics: %s", self.rule_engine.describe())
+        
+        # 更新均量與收盤價快取，供下次選股池篩選
+        if self._price_stats:
+            try:
+                universe.save_price_stats(pd.concat(self._price_stats), self.config.PRICE_STATS_FILE)
+            except OSError as e:
+                self.log.error("Failed to save price stats: %s", e)
         
         return total_kd_df, total_stars_df
     
+    def _save_partial(self, pending: List[str], kd_df: pd.DataFrame, stars_df: pd.DataFrame) -> None:
+        """保存部分結果與未完成的股票，供補跑接續"""
+        partial_dir = Path(self.config.PARTIAL_DIR)
+        self._clear_partial()
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        frames = {"kd": kd_df, "stars": stars_df}
+        if self._indicator_rows:
+            frames["indicators"] = pd.concat(self._indicator_rows, ignore_index=False)
+        for name, screen_frames in self._screen_rows.items():
+            frames[f"screen_{name}"] = pd.concat(screen_frames, ignore_index=False)
+        for name, frame in frames.items():
+            if not frame.empty:
+                frame.to_csv(partial_dir / f"{name}.csv", encoding="utf-8")
+        for name in ("Close", "K", "D", "vol_ratio"):
+            if self._breadth_parts:
+                pd.concat([part[name] for part in self._breadth_parts], axis=1).to_csv(
+                    partial_dir / f"breadth_{name}.csv", encoding="utf-8")
+        if self._dq_flags:
+            pd.concat(self._dq_flags).rename("reason").rename_axis("id").to_csv(
+                partial_dir / "dq.csv", encoding="utf-8")
+        with open(partial_dir / "state.json", "w", encoding="utf-8") as f:
+            json.dump({**self.coverage, "pending_tickers": pending, "dq_counts": self.dq_counts},
+                      f, ensure_ascii=False, indent=2)
+        self.log.info("Saved partial results, %d stocks pending in %s", len(pending), partial_dir)
+    
+    def _load_partial(self) -> Dict:
+        """還原前一次部分結果，並回傳其狀態"""
+        partial_dir = Path(self.config.PARTIAL_DIR)
+        with open(partial_dir / "state.json", "r", encoding="utf-8") as f:
+            state = json.load(f)
+        
+        def read(name: str) -> pd.DataFrame:
+            path = partial_dir / f"{name}.csv"
+            if not path.exists():
+                return pd.DataFrame()
+            return pd.read_csv(path, index_col=0, parse_dates=True, encoding="utf-8", dtype={"id": str})
+        
+        indicators_df = read("indicators")
+        if not indicators_df.empty:
+            self._indicator_rows.append(indicators_df)
+        for path in partial_dir.glob("screen_*.csv"):
+            self._screen_rows[path.stem[len("screen_"):]] = [read(path.stem)]
+        breadth_part = {name: read(f"breadth_{name}") for name in ("Close", "K", "D", "vol_ratio")}
+        if not breadth_part["Close"].empty:
+            self._breadth_parts.append(breadth_part)
+        if (partial_dir / "dq.csv").exists():
+            self._dq_flags.append(pd.read_csv(partial_dir / "dq.csv", index_col=0, encoding="utf-8")["reason"])
+        for reason, count in state.get("dq_counts", {}).items():
+            self.dq_counts[reason] = self.dq_counts.get(reason, 0) + count
+        # 已完成部分的均量資料（排名用）
+        price_stats = universe.load_price_stats(self.config.PRICE_STATS_FILE)
+        done = indicators_df["id"].unique() if not indicators_df.empty else []
+        self._price_stats.append(price_stats[price_stats.index.isin(done)])
+        
+        self.log.info("Resuming partial run of %s: %d/%d done, %d pending",
+                      state["run_date"], state["processed"], state["total"], len(state["pending_tickers"]))
+        return {
+            "kd": read("kd"),
+            "stars": read("stars"),
+            "pending": state["pending_tickers"],
+            "total": state["total"],
+            "processed": state["processed"],
+            "watchlist_total": state["watchlist_total"],
+            "watchlist_processed": state["watchlist_processed"],
+        }
+    
+    def _clear_partial(self) -> None:
+        partial_dir = Path(self.config.PARTIAL_DIR)
+        if partial_dir.exists():
+            for path in partial_dir.iterdir():
+                path.unlink()
+    
+    def run_followup(self) -> None:
+        """補跑今天期限內未完成的股票並重新發佈完整結果"""
+        self.run_analysis(followup=True)
+    
+    def pending_followup(self) -> bool:
+        """今天的部分執行是否還有未完成的股票"""
+        state_file = Path(self.config.PARTIAL_DIR) / "state.json"
+        if not state_file.exists():
+            return False
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("run_date") != datetime.date.today().isoformat():
+            self.log.warning("Discarding pending stocks from the partial run of %s", state.get("run_date"))
+            self._clear_partial()
+            return False
+        return True
+    
+    def compute_breadth(self, tickers_dict: Dict[str, str]) -> pd.DataFrame:
+        """彙總各產業每日的低檔比例、K/D中位數、爆量家數與漲跌家數比"""
+        if not self._breadth_parts:
+            return pd.DataFrame()
+        try:
+            panel = {
+                name: pd.concat([part[name] for part in self._breadth_parts], axis=1)
+                for name in self._breadth_parts[0]
+            }
+            industries = pd.Series({
+                ticker_id: line.split(",")[2].strip() if line.count(",") >= 2 else "Unknown"
+                for ticker_id, line in tickers_dict.items()
+            })
+            breadth_df = breadth.industry_breadth(
+                panel, industries, self.config.DEFAULT_KD_LIMITS,
+                self.config.BREADTH_SPIKE_RATIO, self.config.DEFAULT_DAYS
+            )
+            self.log.info("Industry breadth computed for %d industries over %d sessions",
+                          breadth_df["industry"].nunique(), breadth_df.index.nunique())
+            return breadth_df
+        except Exception as e:
+            self.log.error("Error computing industry breadth: %s", e)
+            return pd.DataFrame()
+        finally:
+            self._breadth_parts = []
+    
+    def get_price_store(self) -> PriceStore:
+        """磁碟上的歷史價格庫"""
+        if self._price_store is None:
+            self._price_store = PriceStore(self.config.PRICE_STORE_DIR)
+        return self._price_store
+    
+    def _append_price_store(self, panel: Dict[str, pd.DataFrame]) -> None:
+        """將本批下載的K棒併入歷史價格庫"""
+        try:
+            self.get_price_store().append(panel)
+        except Exception as e:
+            self.log.error("Failed to update price store: %s", e)
+    
+    def backfill_price_store(self, start: str) -> None:
+        """分批下載 start 起的完整歷史並寫入價格庫，每批寫入後即釋放"""
+        tickers = list(self.select_universe(self.load_stock_list()).keys())
+        end = (datetime.date.today() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        store = self.get_price_store()
+        for i, batch in enumerate(self.chunks(tickers, self.config.BATCH_SIZE)):
+            self.log.info("Backfilling batch %d (%d stocks) from %s", i + 1, len(batch), start)
+            df = self.download_stock_data(batch, window=(start, end))
+            if df is None or df.empty:
+                continue
+            try:
+                store.append(self.build_panel(df, batch))
+            except ValueError as e:
+                self.log.error("Error backfilling batch %d: %s", i + 1, e)
+            del df
+        self.log.info("Price store now holds %s", store.stats())
+    
+    def run_out_of_core(self) -> Dict[str, int]:
+        """以價格庫分塊掃描長期歷史，記憶體用量受 OOC_MEMORY_BUDGET_MB 限制"""
+        tickers_dict = self.select_universe(self.load_stock_list())
+        meta = pd.DataFrame.from_dict({
+            ticker_id: {
+                "name": line.split(",")[1],
+                "industry": line.split(",")[2].strip() if line.count(",") >= 2 else "Unknown",
+            }
+            for ticker_id, line in tickers_dict.items()
+        }, orient="index")
+        
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        outputs = {
+            "kd_low": str(self.report_dir / f'ooc_kd{self.config.DEFAULT_KD_LIMITS}_TW_{current_date}.csv'),
+            "potential_star": str(self.report_dir / f'ooc_stars_TW_{current_date}.csv'),
+            **{
+                rule["name"]: str(self.report_dir / f'ooc_screen_{rule["name"]}_TW_{current_date}.csv')
+                for rule in self.rule_engine.rules if rule["name"] not in BUILTIN_RULES
+            },
+            "latest": str(self.report_dir / f'ooc_indicators_TW_{current_date}.csv'),
+        }
+        runner = out_of_core.OutOfCoreRunner(
+            self.get_price_store(), self.indicator_plan, self.rule_engine,
+            self.config.OOC_MEMORY_BUDGET_MB, self.config.OOC_SPILL_DIR, self.log
+        )
+        counts = runner.run(
+            list(tickers_dict), meta, self.report_columns, self.config.OOC_SCAN_DAYS, outputs
+        )
+        self.log.info("Out-of-core reports saved: %s", outputs)
+        return counts
+    
+    def rank_candidates(self, kd_df: pd.DataFrame, stars_df: pd.DataFrame) -> pd.DataFrame:
+        """為全市場KD候選股評分，各市場與各產業只保留前K名"""
+        if kd_df.empty or self.indicators_df.empty:
+            return pd.DataFrame()
+        
+        # 以本次下載的均量 x 收盤價估計流動性
+        liquidity = None
+        if self._price_stats:
+            stats = pd.concat(self._price_stats)
+            stats = stats[~stats.index.duplicated(keep="last")]
+            liquidity = stats["avg_volume"] * stats["last_close"]
+        
+        scored = ranking.score_candidates(
+            kd_df, self.indicators_df, self.config.DEFAULT_KD_LIMITS,
+            liquidity=liquidity,
+            star_ids=set(stars_df["id"]) if not stars_df.empty else (),
+            weights=self.config.RANK_WEIGHTS
+        )
+        ranked = ranking.select_top(scored, self.config.RANK_TOP_K_MARKET, self.config.RANK_TOP_K_INDUSTRY)
+        self.log.info("Ranked %d KD candidates, kept %d (top %d per market, top %d per industry)",
+                      len(scored), len(ranked), self.config.RANK_TOP_K_MARKET, self.config.RANK_TOP_K_INDUSTRY)
+        return ranked
+    
+    def load_panel(self) -> Dict[str, pd.DataFrame]:
+        """下載整個股票池並計算指標，回傳合併後的 {欄位: 日期 x 股票} 寬表"""
+        tickers = list(self.select_universe(self.load_stock_list()).keys())
+        self.dq_counts = {reason: 0 for reason in data_quality.REASONS}
+        self._dq_flags = []
+        self._price_stats = []
+        
+        parts: Dict[str, List[pd.DataFrame]] = {}
+        for batch in self.chunks(tickers, self.config.BATCH_SIZE):
+            try:
+                prepared = self.prepare_batch(batch)
+            except Exception as e:
+                self.log.error("Error preparing batch: %s", e)
+                continue
+            if prepared is None:
+                continue
+            for name, frame in {**prepared[0], **prepared[1]}.items():
+                parts.setdefault(name, []).append(frame)
+        
+        return {name: pd.concat(frames, axis=1) for name, frames in parts.items()}
+    
+    def run_sweep(self, grid=None) -> pd.DataFrame:
+        """以同一份記憶體中的寬表評估多組 (k_num, d_num, days_in_advance, multiple)"""
+        combos = sweep.expand_grid(grid or self.config.SWEEP_GRID)
+        self.log.info("Running parameter sweep over %d combinations", len(combos))
+        start_time = time.time()
+        
+        panel = self.load_panel()
+        if not panel:
+            self.log.warning("No data available for sweep")
+            return pd.DataFrame()
+        
+        calendar = self.get_calendar()
+        today = datetime.date.today()
+        window_starts = {
+            days: pd.Timestamp(calendar.sessions_back(max(int(days), 1), today)[0])
+            for days in combos["days_in_advance"].unique()
+        }
+        summary = sweep.evaluate(
+            combos, panel["K"], panel["D"], panel["Close"], panel["Volume"], window_starts
+        )
+        
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        sweep_path = self.report_dir / f'sweep_TW_{current_date}.csv'
+        summary.to_csv(sweep_path, sep=",", index=False, header=True, encoding='utf-8-sig')
+        self.log.info("Sweep of %d combinations over %d stocks finished in %.2f seconds: %s",
+                      len(combos), panel["Close"].shape[1], time.time() - start_time, sweep_path)
+        return summary
+    
+    def save_signals(self, kd_df: pd.DataFrame, stars_df: pd.DataFrame) -> None:
+        """將本次訊號整批寫入訊號歷史資料庫"""
+        try:
+            if self._signal_store is None:
+                self._signal_store = SignalStore(self.config.SIGNAL_DB)
+            count = self._signal_store.append_run(kd_df, stars_df)
+            self.log.info("Stored %d signals in %s", count, self.config.SIGNAL_DB)
+        except Exception as e:
+            self.log.exception("Failed to store signals: %s", e)
+    
     def save_results(self, kd_df: pd.DataFrame, stars_df: pd.DataFrame) -> List[str]:
         """保存分析結果"""
         current_date = datetime.datetime.now().strftime("%Y-%m-%d")
@@ -280,6 +850,10 @@ class StockAnalyzer:
         kd_csv_filename = f'kd{self.config.DEFAULT_KD_LIMITS}_TW_{current_date}.csv'
         stars_excel_filename = f'stars_TW_{current_date}.xlsx'
         stars_csv_filename = f'stars_TW_{current_date}.csv'
+        dq_csv_filename = f'dq_TW_{current_date}.csv'
+        ranked_excel_filename = f'ranked_kd{self.config.DEFAULT_KD_LIMITS}_TW_{current_date}.xlsx'
+        ranked_csv_filename = f'ranked_kd{self.config.DEFAULT_KD_LIMITS}_TW_{current_date}.csv'
+        ranked = not self.ranked_df.empty
         
         # 保存KD結果
         if not kd_df.empty:
@@ -291,10 +865,27 @@ class StockAnalyzer:
             kd_csv_path = self.report_dir / kd_csv_filename
             
             kd_df.to_csv(kd_csv_path, sep=",", index=True, header=True, encoding='utf-8-sig')
-            kd_df.to_excel(kd_excel_path, index=True, engine="openpyxl")
+            if ranked:
+                # 完整明細只存CSV，寄送排名後的精簡報表
+                self.log.info("KD results saved: %s", kd_csv_path)
+            else:
+                kd_df.to_excel(kd_excel_path, index=True, engine="openpyxl")
+                attachments.append(str(kd_excel_path))
+                self.log.info("KD results saved: %s", kd_excel_path)
+        
+        # 保存排名結果
+        if ranked:
+            ranked_df = self.ranked_df.copy()
+            ranked_df["id"] = ranked_df["id"].str.replace(r"\.TWO$|\.TW$", "", regex=True)
             
-            attachments.append(str(kd_excel_path))
-            self.log.info("KD results saved: %s", kd_excel_path)
+            ranked_excel_path = self.report_dir / ranked_excel_filename
+            ranked_csv_path = self.report_dir / ranked_csv_filename
+            
+            ranked_df.to_csv(ranked_csv_path, sep=",", index=False, header=True, encoding='utf-8-sig')
+            ranked_df.to_excel(ranked_excel_path, index=False, engine="openpyxl")
+            
+            attachments.insert(0, str(ranked_excel_path))
+            self.log.info("Ranked KD results saved: %s", ranked_excel_path)
         
         # 保存潛在飆股結果
         if not stars_df.empty:
@@ -311,8 +902,71 @@ class StockAnalyzer:
             attachments.append(str(stars_excel_path))
             self.log.info("Potential stars results saved: %s", stars_excel_path)
         
+        # 保存資料品質檢查結果（不寄送）
+        if self._dq_flags:
+            dq_df = pd.concat(self._dq_flags).rename("reason").rename_axis("id").reset_index()
+            dq_csv_path = self.report_dir / dq_csv_filename
+            dq_df.to_csv(dq_csv_path, sep=",", index=False, header=True, encoding='utf-8-sig')
+            self.log.info("Data quality flags saved: %s", dq_csv_path)
+        
+        # 保存自訂規則結果（不寄送）
+        for name, screen_df in self.screen_results.items():
+            if screen_df.empty:
+                continue
+            screen_df = screen_df.copy()
+            screen_df["id"] = screen_df["id"].str.replace(r"\.TWO$|\.TW$", "", regex=True)
+            screen_csv_path = self.report_dir / f'screen_{name}_TW_{current_date}.csv'
+            screen_df.to_csv(screen_csv_path, sep=",", index=True, header=True, encoding='utf-8-sig')
+            self.log.info("Screen %s saved: %s", name, screen_csv_path)
+        
         return attachments
     
+    def save_query_tables(self) -> None:
+        """保存查詢服務所需的最新指標值與產業廣度，不受 EXPORT_REPORTS 影響（不寄送）"""
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        if not self.indicators_df.empty:
+            indicators_df = self.indicators_df.copy()
+            indicators_df["id"] = indicators_df["id"].str.replace(r"\.TWO$|\.TW$", "", regex=True)
+            indicators_csv_path = self.report_dir / f'indicators_TW_{current_date}.csv'
+            self._write_atomic(indicators_df, indicators_csv_path)
+            self.log.info("Latest indicators saved: %s", indicators_csv_path)
+        
+        if not self.breadth_df.empty:
+            breadth_csv_path = self.report_dir / f'breadth_TW_{current_date}.csv'
+            self._write_atomic(self.breadth_df, breadth_csv_path)
+            self.log.info("Industry breadth saved: %s", breadth_csv_path)
+    
+    @staticmethod
+    def _write_atomic(df: pd.DataFrame, path: Path) -> None:
+        """先寫暫存檔再替換，查詢服務不會讀到寫到一半的檔案"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        df.to_csv(tmp_path, sep=",", index=True, header=True, encoding='utf-8-sig')
+        os.replace(tmp_path, path)
+    
+    def save_coverage(self) -> None:
+        """寫出本次涵蓋率標記，部分結果可由此判斷"""
+        if not self.coverage:
+            return
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        coverage_path = self.report_dir / f'coverage_TW_{current_date}.json'
+        with open(coverage_path, "w", encoding="utf-8") as f:
+            json.dump(self.coverage, f, ensure_ascii=False, indent=2)
+        self.log.info("Coverage %d/%d (%s): %s", self.coverage["processed"], self.coverage["total"],
+                      "complete" if self.coverage["complete"] else "partial", coverage_path)
+    
+    def coverage_marker(self) -> Tuple[str, str]:
+        """郵件主旨前綴與說明，完整的一般執行不加標記"""
+        coverage = self.coverage
+        if not coverage or (coverage["complete"] and not coverage["followup"]):
+            return "", ""
+        summary = (f"Coverage: {coverage['processed']}/{coverage['total']} stocks ({coverage['ratio']:.0%}), "
+                   f"watchlist {coverage['watchlist_processed']}/{coverage['watchlist_total']}.")
+        if not coverage["complete"]:
+            return (f"[PARTIAL {coverage['processed']}/{coverage['total']}]",
+                    f"{summary} The deadline was reached; {coverage['pending']} stocks "
+                    f"will be covered by the follow-up pass.")
+        return "[COMPLETE]", f"{summary} Follow-up pass finished the remaining stocks."
+    
     def send_email_report(self, attachments: List[str]) -> None:
         """發送email報告"""
         if not attachments:
@@ -320,22 +974,35 @@ class StockAnalyzer:
             return
         
         try:
-            emailService.send_mail(log=self.log, attaches=attachments)
+            subject_prefix, note = self.coverage_marker()
+            emailService.send_mail(log=self.log, attaches=attachments, subject_prefix=subject_prefix, note=note)
             self.log.info("Email sent successfully")
         except Exception as e:
             self.log.exception("Failed to send email: %s", e)
     
-    def run_analysis(self) -> None:
-        """執行完整分析流程"""
+    def run_analysis(self, force: bool = False, followup: bool = False) -> None:
+        """執行完整分析流程，非交易日略過（force=True 可強制執行）；followup=True 時只補跑今天未完成的股票"""
+        if followup:
+            if not self.pending_followup():
+                self.log.info("No pending stocks, follow-up pass skipped")
+                return
+        elif not force and not self.get_calendar().is_trading_day(datetime.date.today()):
+            self.log.info("Today is not a trading day, analysis skipped")
+            return
+        
         try:
-            self.log.info("Starting stock analysis...")
+            self.log.info("Starting stock analysis%s...", " (follow-up pass)" if followup else "")
             start_time = time.time()
             
             # 執行分析
-            kd_df, stars_df = self.analyze_stocks()
+            kd_df, stars_df = self.analyze_stocks(resume=followup)
+            self.ranked_df = self.rank_candidates(kd_df, stars_df)
             
-            # 保存結果
-            attachments = self.save_results(kd_df, stars_df)
+            # 保存結果（訊號資料庫為主，檔案為選用匯出）
+            self.save_signals(kd_df, stars_df)
+            attachments = self.save_results(kd_df, stars_df) if self.config.EXPORT_REPORTS else []
+            self.save_query_tables()
+            self.save_coverage()
             
             # 發送email
             self.send_email_report(attachments)
@@ -345,6 +1012,7 @@ class StockAnalyzer:
             self.log.info("Analysis completed successfully in %.2f seconds", elapsed_time)
             self.log.info("Found %d stocks with low KD values", len(kd_df))
             self.log.info("Found %d potential star stocks", len(stars_df))
+            self.log.info("Data quality flags: %s", self.dq_counts)
             
         except Exception as e:
             self.log.exception("Analysis failed: %s", e)
@@ -376,9 +1044,44 @@ def load_config() -> Config:
             "DEFAULT_DAYS": config.DEFAULT_DAYS,
             "DATA_PERIOD_DAYS": config.DATA_PERIOD_DAYS,
             "BATCH_SIZE": config.BATCH_SIZE,
+            "DEADLINE_BATCH_SIZE": config.DEADLINE_BATCH_SIZE,
             "POTENTIAL_STAR_THRESHOLD": config.POTENTIAL_STAR_THRESHOLD,
             "MAX_RETRIES": config.MAX_RETRIES,
-            "RETRY_DELAY": config.RETRY_DELAY
+            "RETRY_DELAY": config.RETRY_DELAY,
+            "HOLIDAY_FILE": config.HOLIDAY_FILE,
+            "SIGNAL_DB": config.SIGNAL_DB,
+            "EXPORT_REPORTS": config.EXPORT_REPORTS,
+            "PRICE_CACHE_TTL": config.PRICE_CACHE_TTL,
+            "VOL_RATIO_WINDOW": config.VOL_RATIO_WINDOW,
+            "MIN_VALID_BARS": config.MIN_VALID_BARS,
+            "DQ_DROP_REASONS": config.DQ_DROP_REASONS,
+            "LISTING_DIR": config.LISTING_DIR,
+            "PRICE_STATS_FILE": config.PRICE_STATS_FILE,
+            "PRICE_STATS_WINDOW": config.PRICE_STATS_WINDOW,
+            "PRICE_STATS_MAX_AGE": config.PRICE_STATS_MAX_AGE,
+            "UNIVERSE_FILTER": config.UNIVERSE_FILTER,
+            "SWEEP_GRID": config.SWEEP_GRID,
+            "PRICE_STORE_DIR": config.PRICE_STORE_DIR,
+            "PRICE_STORE_UPDATE": config.PRICE_STORE_UPDATE,
+            "OOC_MEMORY_BUDGET_MB": config.OOC_MEMORY_BUDGET_MB,
+            "OOC_SCAN_DAYS": config.OOC_SCAN_DAYS,
+            "OOC_SPILL_DIR": config.OOC_SPILL_DIR,
+            "RANK_TOP_K_MARKET": config.RANK_TOP_K_MARKET,
+            "RANK_TOP_K_INDUSTRY": config.RANK_TOP_K_INDUSTRY,
+            "RANK_WEIGHTS": config.RANK_WEIGHTS,
+            "BREADTH_SPIKE_RATIO": config.BREADTH_SPIKE_RATIO,
+            "SCREEN_RULES": config.SCREEN_RULES,
+            "WATCHLIST": config.WATCHLIST,
+            "PRIORITY_HISTORY_DAYS": config.PRIORITY_HISTORY_DAYS,
+            "TIME_BUDGET_SECONDS": config.TIME_BUDGET_SECONDS,
+            "DEADLINE": config.DEADLINE,
+            "PARTIAL_DIR": config.PARTIAL_DIR,
+            "INDICATORS": config.INDICATORS,
+            "INDICATOR_PARAMS": config.INDICATOR_PARAMS,
+            "QUERY_API_HOST": config.QUERY_API_HOST,
+            "QUERY_API_PORT": config.QUERY_API_PORT,
+            "STATUS_FILE": config.STATUS_FILE,
+            "SCHEDULE": config.SCHEDULE
         }
         
         try:
@@ -399,7 +1102,23 @@ def main():
         
         # 創建分析器並執行分析
         analyzer = StockAnalyzer(config)
-        analyzer.run_analysis()
+        if "--sweep" in sys.argv:
+            # python yahooBot.py --sweep [grid.json]
+            grid = None
+            position = sys.argv.index("--sweep")
+            if position + 1 < len(sys.argv):
+                with open(sys.argv[position + 1], 'r', encoding='utf-8') as f:
+                    grid = json.load(f)
+            print(analyzer.run_sweep(grid).to_string(index=False))
+        elif "--backfill" in sys.argv:
+            # python yahooBot.py --backfill 2015-01-01
+            analyzer.backfill_price_store(sys.argv[sys.argv.index("--backfill") + 1])
+        elif "--out-of-core" in sys.argv:
+            print(analyzer.run_out_of_core())
+        elif "--followup" in sys.argv:
+            analyzer.run_followup()
+        else:
+            analyzer.run_analysis(force="--force" in sys.argv)
         
     except KeyboardInterrupt:
         print("\nAnalysis interrupted by user")